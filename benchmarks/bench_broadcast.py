@@ -0,0 +1,62 @@
+"""Broadcast tezligi: eski ketma-ket sikl va Broadcaster (soxta Bot bilan).
+
+Ishga tushirish:
+    python benchmarks/bench_broadcast.py --users 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from broadcast import Broadcaster
+from stubs import StubBot
+
+
+async def legacy_broadcast(bot: StubBot, users: list) -> int:
+    success = 0
+    for user_id in users:
+        try:
+            await bot.send_message(chat_id=user_id, text="test")
+            success += 1
+        except Exception:
+            pass
+    return success
+
+
+async def engine_broadcast(bot: StubBot, users: list, rate: float, concurrency: int) -> int:
+    async def send(user_id: int):
+        await bot.send_message(chat_id=user_id, text="test")
+
+    broadcaster = Broadcaster(rate=rate, concurrency=concurrency, progress_interval=1.0)
+    stats = await broadcaster.run(users, send)
+    return stats.get("ok", 0)
+
+
+async def bench(args):
+    users = list(range(1, args.users + 1))
+    runs = [
+        ("legacy", lambda bot: legacy_broadcast(bot, users)),
+        ("engine, rate=inf", lambda bot: engine_broadcast(bot, users, 0, args.concurrency)),
+        (f"engine, rate={args.rate:g}", lambda bot: engine_broadcast(bot, users, args.rate, args.concurrency)),
+    ]
+    print(f"{'usul':<20}{'yuborildi':>10}{'429':>8}{'vaqt, s':>10}{'xabar/s':>10}")
+    for name, run in runs:
+        bot = StubBot(latency=args.latency, flood_rate=args.flood_rate)
+        started = time.perf_counter()
+        success = await run(bot)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<20}{success:>10}{bot.flood_errors:>8}{elapsed:>10.2f}{success / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="soxta API javob vaqti, s")
+    parser.add_argument("--rate", type=float, default=28)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--flood-rate", type=float, default=30, help="soxta Telegram global cheklovi")
+    asyncio.run(bench(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""Callback yo'naltirish narxi: regex zanjiri va lug'atli router.
+
+Application.process_update kabi handlerlar ro'yxati bo'ylab check_update
+chaqiriladi, birinchi mos kelgani topilguncha. Eski ro'yxat - avvalgi
+build_application dagi regex li CallbackQueryHandler lar; yangisi -
+bot.build_application dagi haqiqiy ro'yxat. Alohida klaviaturani har safar
+qurish va tayyor nusxani olish narxi ham o'lchanadi.
+
+Ishga tushirish:
+    python benchmarks/bench_callback_dispatch.py --rounds 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackQueryHandler
+
+import bot
+from stubs import callback_update, to_update
+
+CALLBACKS = (
+    "show_games", "game_Express", "earn", "balance", "withdraw", "main_menu",
+    "admin_stats", "admin_metrics", "admin_close", "admin_broadcast", "admin_add",
+)
+
+
+async def noop(update, context):
+    pass
+
+
+def legacy_handlers() -> list:
+    return [
+        CallbackQueryHandler(noop, pattern="^show_games$"),
+        CallbackQueryHandler(noop, pattern="^game_"),
+        CallbackQueryHandler(noop, pattern="^earn$"),
+        CallbackQueryHandler(noop, pattern="^balance$"),
+        CallbackQueryHandler(noop, pattern="^withdraw$"),
+        CallbackQueryHandler(noop, pattern="^main_menu$"),
+        CallbackQueryHandler(noop, pattern="^(admin_stats|admin_users_count|admin_cache|admin_metrics|admin_close|admin_back)$"),
+        CallbackQueryHandler(noop, pattern="^admin_broadcast$"),
+        CallbackQueryHandler(noop, pattern="^admin_add$"),
+    ]
+
+
+def router_handlers() -> list:
+    app = bot.build_application()
+    return [handler for handlers in app.handlers.values() for handler in handlers]
+
+
+def dispatch_cost(handlers: list, update, rounds: int) -> float:
+    """Bitta update uchun mos handlerni topish vaqti, mikrosekund"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for handler in handlers:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                break
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def legacy_main_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("📊 Kun stavkasi", callback_data="show_games")],
+        [
+            InlineKeyboardButton("💰 Pul ishlash", callback_data="earn"),
+            InlineKeyboardButton("💵 Balans", callback_data="balance")
+        ]
+    ])
+
+
+def legacy_game_keyboard(names: list) -> InlineKeyboardMarkup:
+    keyboard = [[InlineKeyboardButton(game, callback_data=f"game_{game}")] for game in names]
+    keyboard.append([InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def per_call(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main(args):
+    telegram_bot = Bot("123456:TEST")
+    updates = {data: to_update(callback_update(1, data), telegram_bot) for data in CALLBACKS}
+    legacy, routed = legacy_handlers(), router_handlers()
+
+    print(f"{'callback_data':<18}{'regex, us':>12}{'router, us':>12}")
+    totals = [0.0, 0.0]
+    for data, update in updates.items():
+        costs = [dispatch_cost(handlers, update, args.rounds) for handlers in (legacy, routed)]
+        totals = [total + cost for total, cost in zip(totals, costs)]
+        print(f"{data:<18}{costs[0]:>12.2f}{costs[1]:>12.2f}")
+    print(f"{'o`rtacha':<18}{totals[0] / len(updates):>12.2f}{totals[1] / len(updates):>12.2f}")
+
+    names = [f"Kupon {i}" for i in range(args.games)]
+    bot.catalog._games = {name: {"name": name} for name in names}
+    bot.catalog.version = 1
+    print(f"\n{'klaviatura':<18}{'qurish, us':>12}{'kesh, us':>12}")
+    print(f"{'main':<18}{per_call(legacy_main_keyboard, args.rounds):>12.2f}{per_call(lambda: bot.MAIN_KEYBOARD, args.rounds):>12.2f}")
+    print(
+        f"{f'games ({args.games})':<18}{per_call(lambda: legacy_game_keyboard(names), args.rounds):>12.2f}"
+        f"{per_call(bot.get_game_keyboard, args.rounds):>12.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--games", type=int, default=10)
+    main(parser.parse_args())
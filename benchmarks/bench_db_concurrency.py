@@ -0,0 +1,141 @@
+"""/start handleri yuklamasi: eski (bloklovchi) va yangi (DB worker) usul.
+
+Ishga tushirish:
+    python benchmarks/bench_db_concurrency.py --users 2000 --concurrency 10 100 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+# ------------------- ESKI USUL (har so'rovda yangi ulanish) -------------------
+async def legacy_get_user(db_path: str, user_id: int, username: str = None) -> dict:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    user = cursor.fetchone()
+    if not user:
+        while True:
+            code = f"{random.randint(0, 9999999):07d}"
+            cursor.execute("SELECT user_id FROM users WHERE withdraw_code = ?", (code,))
+            if not cursor.fetchone():
+                break
+        cursor.execute(
+            "INSERT INTO users (user_id, username, balance, withdraw_code) VALUES (?, ?, ?, ?)",
+            (user_id, username, 0, code),
+        )
+        conn.commit()
+        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        user = cursor.fetchone()
+    conn.close()
+    return dict(user)
+
+
+def legacy_update_balance(db_path: str, user_id: int, amount: int, reason: str = ""):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+    old_balance = cursor.fetchone()[0]
+    cursor.execute("UPDATE users SET balance = ? WHERE user_id = ?", (old_balance + amount, user_id))
+    cursor.execute(
+        "INSERT INTO balance_history (user_id, old_balance, new_balance, amount, reason) VALUES (?, ?, ?, ?, ?)",
+        (user_id, old_balance, old_balance + amount, amount, reason),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_user_balance(db_path: str, user_id: int) -> int:
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+async def legacy_handler(db_path: str, user_id: int, referrer_id: int):
+    await legacy_get_user(db_path, user_id, f"user{user_id}")
+    legacy_update_balance(db_path, referrer_id, 2500, "Referral bonus")
+    legacy_get_user_balance(db_path, referrer_id)
+    await asyncio.sleep(0.005)  # Telegram API javobi
+
+
+# ------------------- YANGI USUL -------------------
+async def worker_handler(db_path: str, user_id: int, referrer_id: int):
+    await database.get_user(user_id, f"user{user_id}")
+    await database.update_balance(referrer_id, 2500, "Referral bonus")
+    await database.get_user_balance(referrer_id)
+    await asyncio.sleep(0.005)
+
+
+# ------------------- O'LCHASH -------------------
+async def loop_lag_probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - started - 0.001)
+
+
+async def measure(handler, db_path: str, concurrency: int, first_id: int, referrers: list) -> dict:
+    stop = asyncio.Event()
+    lags = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        handler(db_path, first_id + i, random.choice(referrers)) for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return {
+        "elapsed": elapsed,
+        "rate": concurrency / elapsed,
+        "max_lag_ms": max(lags, default=0) * 1000,
+    }
+
+
+def seed(db_path: str, users: int) -> list:
+    database.close_database()
+    database.open_database(db_path)
+    database.init_database()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO users (user_id, username, balance, withdraw_code) VALUES (?, ?, 0, ?)",
+        ((i, f"seed{i}", f"{i:07d}") for i in range(1, users + 1)),
+    )
+    conn.commit()
+    conn.close()
+    return list(range(1, users + 1))
+
+
+async def bench(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        referrers = seed(db_path, args.users)
+        next_id = 10_000_000
+        print(f"{'usul':<10}{'parallel':>10}{'vaqt, s':>10}{'handler/s':>12}{'max lag, ms':>14}")
+        for concurrency in args.concurrency:
+            for name, handler in (("legacy", legacy_handler), ("worker", worker_handler)):
+                result = await measure(handler, db_path, concurrency, next_id, referrers)
+                next_id += concurrency
+                print(
+                    f"{name:<10}{concurrency:>10}{result['elapsed']:>10.2f}"
+                    f"{result['rate']:>12.0f}{result['max_lag_ms']:>14.1f}"
+                )
+        database.close_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 1000])
+    asyncio.run(bench(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""Balans amallari: har chaqiruvda commit va group commit (LedgerWriter).
+
+Parallel update_balance / credit_referral chaqiruvlari (referral to'lqini
+kabi) yangi bazada bajariladi. "har chaqiruv" rejimida ledger.max_batch = 1,
+ya'ni har amal o'z commit i bilan. fsync narxi ko'rinishi uchun standart
+holatda synchronous=FULL ishlatiladi.
+
+Ishga tushirish:
+    python benchmarks/bench_ledger.py --ops 5000 --concurrency 64 --synchronous FULL
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_ops(database, args, users: int, first_new: int) -> list:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def op(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            if i % 2:
+                await database.credit_referral(random.randint(1, users), first_new + i, 2500)
+            else:
+                await database.update_balance(random.randint(1, users), 100, "bench")
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(op(i) for i in range(args.ops)))
+    return latencies
+
+
+def measure(tmp: str, name: str, max_batch: int, args) -> tuple:
+    import database
+    from loadtest import percentile, seed
+
+    database.open_database(os.path.join(tmp, f"ledger_{name}.db"))
+    database.init_database()
+    database.run_sync(seed, args.users)
+    batches = []
+    original = database._apply_ledger_batch
+
+    def counted(conn, ops):
+        batches.append(len(ops))
+        return original(conn, ops)
+
+    database._apply_ledger_batch = counted
+    database.ledger.max_batch = max_batch
+    try:
+        started = time.perf_counter()
+        latencies = asyncio.run(run_ops(database, args, args.users, args.users + 1))
+        elapsed = time.perf_counter() - started
+    finally:
+        database._apply_ledger_batch = original
+        database.close_database()
+    return elapsed, len(batches), percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main(args):
+    os.environ["DB_SYNCHRONOUS"] = args.synchronous
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        print(f"Amallar: {args.ops}, parallel: {args.concurrency}, synchronous={args.synchronous}")
+        print(f"{'rejim':<14}{'amal/s':>10}{'commit':>9}{'p50, ms':>10}{'p99, ms':>10}")
+        for name, max_batch in (("har chaqiruv", 1), ("group commit", args.batch)):
+            random.seed(args.seed)
+            elapsed, commits, p50, p99 = measure(tmp, name.replace(" ", "_"), max_batch, args)
+            print(f"{name:<14}{args.ops / elapsed:>10.0f}{commits:>9}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=256, help="group commit dagi maksimal amallar")
+    parser.add_argument("--synchronous", default="FULL", choices=("OFF", "NORMAL", "FULL"))
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
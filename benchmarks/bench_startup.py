@@ -0,0 +1,80 @@
+"""Sovuq start: init_database() + JSON tekshiruvlari yangi jarayonda.
+
+Baza bir marta to'ldiriladi, keyin har o'lchov alohida Python jarayonida
+(import lar hisobga olinmaydi) bajariladi:
+- "joriy": user_version oxirgi versiyada - DDL bajarilmaydi;
+- "eski": user_version = 0 - barcha migratsiyalar qaytadan (IF NOT EXISTS),
+  versiyalashdan oldingi har startdagi ish.
+Diskdagi kesh tozalanmaydi, shuning uchun natija "issiq" fayl uchun.
+
+Ishga tushirish:
+    python benchmarks/bench_startup.py --users 200000 --runs 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from loadtest import seed
+
+CHILD = """
+import contextlib, io, sys, time
+sys.path.insert(0, {root!r})
+import database
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    database.open_database({db_path!r})
+    database.init_database()
+    database.migrate_from_json()
+    database.import_games_from_json()
+print(time.perf_counter() - started)
+database.close_database()
+"""
+
+
+def cold_start(db_path: str, workdir: str) -> float:
+    code = CHILD.format(root=ROOT, db_path=db_path)
+    output = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def set_user_version(db_path: str, version: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.close()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        database.open_database(db_path)
+        database.init_database()
+        database.run_sync(seed, args.users)
+        database.close_database()
+        print(f"Baza: {args.users} foydalanuvchi, {os.path.getsize(db_path) / 1e6:.1f} MB, sxema v{database.SCHEMA_VERSION}")
+        print(f"{'holat':<10}{'min, ms':>10}{'median, ms':>12}")
+        for name, version in (("eski", 0), ("joriy", database.SCHEMA_VERSION)):
+            samples = []
+            for _ in range(args.runs):
+                set_user_version(db_path, version)
+                samples.append(cold_start(db_path, tmp))
+            samples.sort()
+            print(f"{name:<10}{samples[0] * 1000:>10.1f}{samples[len(samples) // 2] * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    main(args)
@@ -0,0 +1,92 @@
+"""Withdraw kod ajratish tezligi jadval to'lganlik darajasiga qarab.
+
+Eski usul: tasodifiy kod + SELECT, bo'sh topilguncha. Yangi usul: saqlangan
+tartib raqami + kalitli permutatsiya (qidiruvsiz). Kod maydoni kichraytirilgan
+(--domain), shunda yuqori to'lganlikni tez tayyorlash mumkin.
+
+Ishga tushirish:
+    python benchmarks/bench_withdraw_codes.py --domain 200000 --fill 0.5 0.9 0.99
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codes import CodePermutation
+
+SCHEMA = """
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, withdraw_code TEXT UNIQUE);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+"""
+
+
+def legacy_allocate(cursor, domain: int, width: int) -> str:
+    while True:
+        code = f"{random.randint(0, domain - 1):0{width}d}"
+        cursor.execute("SELECT user_id FROM users WHERE withdraw_code = ?", (code,))
+        if not cursor.fetchone():
+            return code
+
+
+def sequence_allocate(cursor, permutation: CodePermutation) -> str:
+    cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'seq' RETURNING value")
+    return permutation.format(cursor.fetchone()[0])
+
+
+def prepare(path: str, permutation: CodePermutation, filled: int, legacy: bool):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    if legacy:
+        codes = random.sample(range(permutation.domain), filled)
+    else:
+        codes = [permutation.encode(seq) for seq in range(filled)]
+    conn.executemany(
+        "INSERT INTO users (user_id, withdraw_code) VALUES (?, ?)",
+        ((i, f"{code:0{permutation.width}d}") for i, code in enumerate(codes)),
+    )
+    conn.execute("INSERT INTO meta (key, value) VALUES ('seq', ?)", (filled - 1,))
+    conn.commit()
+    return conn
+
+
+def measure(conn, allocate, count: int, first_id: int) -> float:
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    for i in range(count):
+        code = allocate(cursor)
+        cursor.execute("INSERT INTO users (user_id, withdraw_code) VALUES (?, ?)", (first_id + i, code))
+    conn.commit()
+    return count / (time.perf_counter() - started)
+
+
+def main(args):
+    permutation = CodePermutation(b"bench-key", domain=args.domain)
+    print("to'lganlik".ljust(12) + "eski, kod/s".rjust(14) + "yangi, kod/s".rjust(14))
+    with tempfile.TemporaryDirectory() as tmp:
+        for fill in args.fill:
+            filled = int(args.domain * fill)
+            count = min(args.count, args.domain - filled - 1)
+            rates = []
+            for legacy in (True, False):
+                path = os.path.join(tmp, f"codes_{fill}_{legacy}.db")
+                conn = prepare(path, permutation, filled, legacy)
+                if legacy:
+                    allocate = lambda cursor: legacy_allocate(cursor, permutation.domain, permutation.width)
+                else:
+                    allocate = lambda cursor: sequence_allocate(cursor, permutation)
+                rates.append(measure(conn, allocate, count, filled + 1))
+                conn.close()
+            print(f"{fill:<12.0%}{rates[0]:>14.0f}{rates[1]:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domain", type=int, default=200_000)
+    parser.add_argument("--fill", type=float, nargs="+", default=[0.1, 0.5, 0.9, 0.99])
+    parser.add_argument("--count", type=int, default=1000)
+    main(parser.parse_args())
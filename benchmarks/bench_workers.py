@@ -0,0 +1,98 @@
+"""Multi-process rejim: worker jarayonlari soniga qarab o'tkazuvchanlik.
+
+Har o'lchovda yangi baza va navbat tayyorlanadi, N ta worker (bot.run_worker,
+soxta Bot API bilan) ishga tushiriladi. Avval har shardga bittadan isitish
+update i yuborilib, hammasi tayyor bo'lgach asosiy to'plam navbatga yoziladi
+va navbat bo'shaguncha vaqt o'lchanadi. Natija CPU yadrolari soniga bog'liq.
+
+Ishga tushirish:
+    python benchmarks/bench_workers.py --workers 1 2 4 --updates 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from loadtest import make_updates, seed
+from stubs import StubRequest, callback_update
+from update_queue import UPDATE, UpdateQueue
+from workers import WorkerPool
+
+
+def bench_worker(shard: int, shards: int, queue_path: str, db_path: str, latency: float):
+    import bot
+
+    logging.getLogger().setLevel(logging.ERROR)
+    bot.outbox.bucket.rate = 0
+    bot.run_worker(shard, shards, queue_path, db_path, StubRequest(latency=latency))
+
+
+def payload(data: dict) -> tuple:
+    user = (data.get("message") or data.get("callback_query"))["from"]
+    return user["id"], UPDATE, json.dumps(data)
+
+
+async def drain(update_queue: UpdateQueue, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while sum((await update_queue.depth()).values()):
+        if time.monotonic() > deadline:
+            raise TimeoutError("queue not drained")
+        await asyncio.sleep(0.02)
+
+
+async def measure(tmp: str, workers: int, args) -> float:
+    db_path = os.path.join(tmp, f"bench_{workers}.db")
+    queue_path = os.path.join(tmp, f"queue_{workers}.db")
+    database.open_database(db_path)
+    database.init_database()
+    database.run_sync(seed, args.users)
+    database.close_database()
+
+    update_queue = UpdateQueue(queue_path, workers)
+    pool = WorkerPool(bench_worker, workers, (queue_path, db_path, args.latency))
+    pool.start()
+    try:
+        # Isitish: har shardga bitta update, worker lar tayyor bo'lguncha kutiladi
+        await update_queue.put(payload(callback_update(shard + 1, "balance")) for shard in range(workers))
+        await drain(update_queue)
+
+        updates = [payload(data) for _, data in make_updates(args.updates, args.users)]
+        started = time.perf_counter()
+        for i in range(0, len(updates), 500):
+            await update_queue.put(updates[i:i + 500])
+        await drain(update_queue)
+        return time.perf_counter() - started
+    finally:
+        await pool.stop()
+        update_queue.close()
+
+
+async def bench(args):
+    print(f"CPU: {os.cpu_count()}, update lar: {args.updates}, API kechikishi: {args.latency * 1000:.0f} ms")
+    print(f"{'worker':>8}{'vaqt, s':>10}{'update/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            elapsed = await measure(tmp, workers, args)
+            print(f"{workers:>8}{elapsed:>10.2f}{args.updates / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.03, help="soxta Bot API kechikishi, s")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    logging.getLogger().setLevel(logging.ERROR)
+    asyncio.run(bench(args))
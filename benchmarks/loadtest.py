@@ -0,0 +1,180 @@
+"""Oflayn yuklama testi: haqiqiy handlerlar, soxta Bot API, oldindan to'ldirilgan baza.
+
+/start (referral bilan) va har bir callback (show_games, game_*, earn,
+balance, withdraw) uchun sintetik Update lar Application.process_update
+orqali parallel yuboriladi. Natijada umumiy o'tkazuvchanlik hamda har bir
+handler va database.py funksiyasi uchun p50/p99 kechikish chiqariladi.
+
+Ishga tushirish:
+    python benchmarks/loadtest.py --users 100000 --updates 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from stubs import StubRequest, callback_update, start_update, to_update
+
+GAMES = ("Kupon 1", "Kupon 2", "Express", "Live", "Top 5")
+
+# Update turlari va ularning ulushi
+MIX = (
+    ("start", 0.20),
+    ("show_games", 0.15),
+    ("game", 0.20),
+    ("earn", 0.15),
+    ("balance", 0.15),
+    ("withdraw", 0.15),
+)
+
+
+def seed(conn, users: int, batch: int = 10000):
+    """users jadvalini tayyor ma'lumot bilan to'ldirish (worker ichida)"""
+    cursor = conn.cursor()
+    for start in range(1, users + 1, batch):
+        rows = []
+        for user_id in range(start, min(start + batch, users + 1)):
+            referred_by = random.randint(1, user_id - 1) if user_id > 1 and random.random() < 0.3 else None
+            rows.append((
+                user_id,
+                f"user{user_id}",
+                random.choice((0, 2500, 15000, 17500, 30000)),
+                referred_by,
+                1 if random.random() < 0.8 else 0,
+                database.generate_unique_code(cursor),
+            ))
+        cursor.executemany(
+            "INSERT INTO users (user_id, username, balance, referred_by, start_bonus_given, withdraw_code) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    for name in GAMES:
+        database._add_game(conn, name, {"text": f"<b>{name}</b>", "button_text": "Stavka", "button_url": "https://example.com"})
+
+
+def make_updates(count: int, users: int) -> list:
+    kinds = [kind for kind, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    next_user = users + 1
+    updates = []
+    for kind in random.choices(kinds, weights, k=count):
+        if kind == "start":
+            updates.append((kind, start_update(next_user, random.randint(1, users))))
+            next_user += 1
+        elif kind == "game":
+            updates.append((kind, callback_update(random.randint(1, users), f"game_{random.choice(GAMES)}")))
+        else:
+            updates.append((kind, callback_update(random.randint(1, users), kind)))
+    return updates
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def print_table(title: str, samples: dict):
+    print(f"\n{title}")
+    print(f"{'nomi':<28}{'soni':>8}{'p50, ms':>10}{'p99, ms':>10}")
+    for name, values in sorted(samples.items(), key=lambda item: -percentile(item[1], 0.99)):
+        print(f"{name:<28}{len(values):>8}{percentile(values, 0.5) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}")
+
+
+def instrument_database(samples: dict):
+    """database.run va ledger.submit ni o'rab, har bir funksiya uchun to'liq kechikishni yozish"""
+    original = database.run
+
+    async def timed_run(fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(fn, *args, **kwargs)
+        finally:
+            samples[fn.__name__.lstrip("_")].append(time.perf_counter() - started)
+
+    database.run = timed_run
+    # Balans amallari run orqali emas, ledger partiyasida ketadi - commit gacha kutish bilan birga
+    submit = database.ledger.submit
+
+    def timed_submit(fn, *args):
+        started = time.perf_counter()
+        future = submit(fn, *args)
+        future.add_done_callback(
+            lambda _: samples[fn.__name__.lstrip("_")].append(time.perf_counter() - started)
+        )
+        return future
+
+    database.ledger.submit = timed_submit
+
+
+async def run(args):
+    logging.getLogger().setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        database.open_database(os.path.join(tmp, "loadtest.db"))
+        database.init_database()
+        started = time.perf_counter()
+        database.run_sync(seed, args.users)
+        print(f"Baza: {args.users} foydalanuvchi, {time.perf_counter() - started:.1f} s")
+
+        import bot
+
+        request = StubRequest(latency=args.latency, flood_chance=args.flood_chance)
+        app = bot.build_application(request)
+        # Chiquvchi navbat cheklovi (0 - cheklovsiz, faqat handler/DB narxi o'lchanadi)
+        bot.outbox.bucket.rate = args.outbox_rate
+        await app.initialize()
+        await bot.post_init(app)
+
+        handler_samples = collections.defaultdict(list)
+        db_samples = collections.defaultdict(list)
+        instrument_database(db_samples)
+
+        updates = [(kind, to_update(data, app.bot)) for kind, data in make_updates(args.updates, args.users)]
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def process(kind, update):
+            async with semaphore:
+                t0 = time.perf_counter()
+                await app.process_update(update)
+                handler_samples[kind].append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(process(kind, update) for kind, update in updates))
+        elapsed = time.perf_counter() - started
+
+        # shutdown persistence ni yozadi - baza undan keyin yopiladi
+        await app.shutdown()
+        await bot.post_shutdown(app)
+
+    errors = sum(value for _, value in bot.metrics.handler_errors.items())
+    print(f"Update lar: {args.updates}, parallel: {args.concurrency}, API kechikishi: {args.latency * 1000:.0f} ms")
+    print(f"O'tkazuvchanlik: {args.updates / elapsed:.0f} update/s ({elapsed:.2f} s)")
+    print(f"API chaqiruvlar: {len(request.calls)}, 429: {request.flood_errors}, handler xatolari: {errors:g}")
+    print_table("Handlerlar", handler_samples)
+    print_table("database.py funksiyalari (navbat bilan)", db_samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="bazadagi foydalanuvchilar soni")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.03, help="soxta Bot API kechikishi, s")
+    parser.add_argument("--flood-chance", type=float, default=0.0, help="429 javob ehtimoli")
+    parser.add_argument("--outbox-rate", type=float, default=0, help="chiquvchi xabarlar umumiy cheklovi, xabar/s")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
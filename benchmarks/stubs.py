@@ -0,0 +1,164 @@
+"""Benchmarklar uchun soxta Telegram Bot, Bot API va sintetik Update lar."""
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from telegram import Update
+from telegram.error import Forbidden, RetryAfter
+from telegram.request import BaseRequest
+
+
+class StubBot:
+    """Yuborilgan xabarlarni yozib boradi, kechikish va 429 larni taqlid qiladi.
+
+    `flood_rate` - sekundiga shu sondan ko'p so'rov kelsa RetryAfter qaytariladi
+    (Telegram ning global cheklovi kabi), `flood_chance` - tasodifiy 429 ehtimoli.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        flood_rate: float = None,
+        flood_chance: float = 0.0,
+        retry_after: int = 1,
+        blocked: set = None,
+    ):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_chance = flood_chance
+        self.retry_after = retry_after
+        self.blocked = blocked or set()
+        self.sent = []
+        self.flood_errors = 0
+        self._window = []
+
+    def _check_flood(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.flood_rate:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.flood_rate:
+                self.flood_errors += 1
+                raise RetryAfter(self.retry_after)
+            self._window.append(now)
+        if self.flood_chance and random.random() < self.flood_chance:
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        self._check_flood()
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.sent.append((chat_id, text))
+
+    async def send_photo(self, chat_id: int, photo: str, caption: str = None, **kwargs):
+        await self.send_message(chat_id, caption or "", **kwargs)
+
+
+# ------------------- SOXTA BOT API (Application uchun) -------------------
+BOT_USER = {"id": 123456789, "is_bot": True, "first_name": "Bot", "username": "Winwin_premium_bonusbot"}
+
+
+class StubRequest(BaseRequest):
+    """Bot API ga bormasdan javob qaytaruvchi so'rov qatlami.
+
+    Application ni haqiqiy handlerlar bilan oflayn ishga tushirish uchun:
+    `latency` - har bir API chaqiruv kechikishi, `flood_chance` - 429 ehtimoli.
+    Yuborilgan barcha chaqiruvlar `calls` ro'yxatiga yoziladi.
+    """
+
+    def __init__(self, latency: float = 0.03, flood_chance: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.flood_chance = flood_chance
+        self.retry_after = retry_after
+        self.calls = []
+        self.flood_errors = 0
+        self._message_ids = itertools.count(1000)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params: dict) -> dict:
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text") or params.get("caption") or "",
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == "getMe":
+            return 200, json.dumps({"ok": True, "result": BOT_USER}).encode()
+        if self.flood_chance and random.random() < self.flood_chance:
+            self.flood_errors += 1
+            return 429, json.dumps({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+        self.calls.append((endpoint, params))
+        if endpoint.startswith(("send", "edit")):
+            result = self._message(params)
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+# ------------------- SINTETIK UPDATE LAR -------------------
+_update_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def start_update(user_id: int, referrer_id: int = None) -> dict:
+    text = f"/start ref_{referrer_id}" if referrer_id else "/start"
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": _user(user_id),
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+def callback_update(user_id: int, data: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": _user(user_id),
+            "message": {
+                "message_id": next(_update_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "menu",
+            },
+        },
+    }
+
+
+def to_update(data: dict, bot) -> Update:
+    return Update.de_json(data, bot)
@@ -1,11 +1,11 @@
+import functools
 import json
 import logging
 import os
 import asyncio
-import random
-import traceback
-import sqlite3
-from pathlib import Path
+import signal
+import time
+from datetime import date, timedelta
 from typing import Dict
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -17,10 +17,26 @@ from telegram.ext import (
     filters,
     ContextTypes,
     ConversationHandler,
+    TypeHandler,
 )
+from telegram.helpers import escape_markdown
 
 from config import *
 import database
+import metrics
+import broadcast
+from broadcast import Broadcaster, DeliveryLedger
+from catalog import GameCatalog
+from limiter import UpdateLimiter
+from outbox import Outbox
+from persistence import SQLitePersistence
+from retention import HistoryCompactor
+from router import CallbackRouter
+from scheduler import BonusScheduler
+from update_queue import UPDATE, UpdateQueue
+from view_counter import ViewCounter
+from webserver import Request, Response, WebServer
+from workers import ShardConsumer, WorkerPool
 
 # ------------------- LOGLASH -------------------
 logging.basicConfig(
@@ -30,50 +46,109 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ------------------- O'YINLAR MA'LUMOTLARI -------------------
-def load_games() -> Dict:
-    if Path(DATA_FILE).exists():
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_games(games: Dict):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(games, f, ensure_ascii=False, indent=4)
-
-games_data = load_games()
+catalog = GameCatalog()
+
+async def flush_game_views(deltas: Dict[str, int], events: list):
+    """Yig'ilgan ko'rishlarni bazaga yozib, katalog nusxasiga qo'shish"""
+    await database.add_game_views(deltas, events)
+    catalog.apply_views(deltas)
+
+view_counter = ViewCounter(flush_game_views, VIEWS_FLUSH_INTERVAL, VIEWS_FLUSH_MAX_DIRTY)
+bonus_scheduler = BonusScheduler(START_BONUS)
+history_compactor = HistoryCompactor(HISTORY_RETENTION_DAYS, HISTORY_COMPACT_INTERVAL)
+outbox = Outbox(
+    rate=OUTBOX_RATE,
+    burst=OUTBOX_BURST,
+    chat_rate=OUTBOX_CHAT_RATE,
+    chat_burst=OUTBOX_CHAT_BURST,
+    concurrency=OUTBOX_CONCURRENCY,
+)
 
 # ------------------- YORDAMCHI FUNKSIYALAR -------------------
 def is_admin(user_id: int) -> bool:
     return user_id == ADMIN_ID
 
-def get_game_keyboard() -> InlineKeyboardMarkup:
-    keyboard = []
-    for game in games_data.keys():
-        keyboard.append([InlineKeyboardButton(game, callback_data=f"game_{game}")])
-    keyboard.append([InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_admin_keyboard() -> InlineKeyboardMarkup:
-    keyboard = [
-        [InlineKeyboardButton("➕ Add Game", callback_data="admin_add")],
-        [InlineKeyboardButton("➖ Remove Game", callback_data="admin_remove_list")],
-        [InlineKeyboardButton("✏️ Edit Game", callback_data="admin_edit_list")],
-        [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")],
-        [InlineKeyboardButton("📨 Broadcast", callback_data="admin_broadcast")],
-        [InlineKeyboardButton("👥 Users Count", callback_data="admin_users_count")],
-        [InlineKeyboardButton("❌ Close", callback_data="admin_close")]
+# ------------------- TAYYOR EKRANLAR -------------------
+# Telegram obyektlari o'zgarmas - statik klaviaturalar bir marta quriladi
+BACK_BUTTON = InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")
+WITHDRAW_BUTTON = InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")
+
+BACK_KEYBOARD = InlineKeyboardMarkup([[BACK_BUTTON]])
+BALANCE_KEYBOARD = InlineKeyboardMarkup([
+    [WITHDRAW_BUTTON],
+    [InlineKeyboardButton("📜 Tarix", callback_data="history")],
+    [BACK_BUTTON]
+])
+WITHDRAW_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💳 Saytga o‘tish", url=WITHDRAW_SITE_URL)],
+    [BACK_BUTTON]
+])
+
+MAIN_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📊 Kun stavkasi", callback_data="show_games")],
+    [
+        InlineKeyboardButton("💰 Pul ishlash", callback_data="earn"),
+        InlineKeyboardButton("💵 Balans", callback_data="balance")
     ]
-    return InlineKeyboardMarkup(keyboard)
+])
+
+ADMIN_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add Game", callback_data="admin_add")],
+    [InlineKeyboardButton("➖ Remove Game", callback_data="admin_remove_list")],
+    [InlineKeyboardButton("✏️ Edit Game", callback_data="admin_edit_list")],
+    [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")],
+    [InlineKeyboardButton("📨 Broadcast", callback_data="admin_broadcast")],
+    [InlineKeyboardButton("👥 Users Count", callback_data="admin_users_count")],
+    [InlineKeyboardButton("🗂 Cache", callback_data="admin_cache")],
+    [InlineKeyboardButton("📈 Metrics", callback_data="admin_metrics")],
+    [InlineKeyboardButton("❌ Close", callback_data="admin_close")]
+])
+
+WELCOME_TEXT = (
+    "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
+    "🔥 *Premium bonuslar* va har hafta yangi yutuqlar!\n"
+    "📊 *Signal xizmati* va *kunlik kuponlar*\n\n"
+    "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
+)
+MAIN_MENU_TEXT = "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
 
-def get_main_keyboard() -> InlineKeyboardMarkup:
-    keyboard = [
-        [InlineKeyboardButton("📊 Kun stavkasi", callback_data="show_games")],
-        [
-            InlineKeyboardButton("💰 Pul ishlash", callback_data="earn"),
-            InlineKeyboardButton("💵 Balans", callback_data="balance")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+# Katalogga bog'liq ekranlar - faqat katalog versiyasi o'zgarganda qayta quriladi
+_catalog_screens: Dict[str, InlineKeyboardMarkup] = {}
+_catalog_screens_version = None
+
+def _get_catalog_screens() -> Dict[str, InlineKeyboardMarkup]:
+    global _catalog_screens, _catalog_screens_version
+    if _catalog_screens_version != catalog.version:
+        _catalog_screens = {}
+        _catalog_screens_version = catalog.version
+    return _catalog_screens
+
+def get_game_keyboard() -> InlineKeyboardMarkup:
+    screens = _get_catalog_screens()
+    keyboard = screens.get("show_games")
+    if keyboard is None:
+        rows = [[InlineKeyboardButton(game, callback_data=f"game_{game}")] for game in catalog.names()]
+        rows.append([BACK_BUTTON])
+        keyboard = screens["show_games"] = InlineKeyboardMarkup(rows)
+    return keyboard
+
+def get_game_markup(game_name: str, game: dict) -> InlineKeyboardMarkup:
+    screens = _get_catalog_screens()
+    key = f"game_{game_name}"
+    markup = screens.get(key)
+    if markup is None:
+        button_text = game.get("button_text")
+        button_url = game.get("button_url")
+        if button_text and button_url:
+            markup = InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=button_url)], [BACK_BUTTON]])
+        else:
+            markup = BACK_KEYBOARD
+        screens[key] = markup
+    return markup
+
+def reply(update: Update, method, *args, **kwargs):
+    """Javobni foydalanuvchi chatining navbati orqali yuborish (tartib va flood nazorati)"""
+    return outbox.send(update.effective_user.id, method, *args, **kwargs)
 
 def get_referral_link(user_id: int) -> str:
     return f"https://t.me/{BOT_USERNAME}?start=ref_{user_id}"
@@ -91,115 +166,86 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             ref_user_id = int(args[0].replace("ref_", ""))
             if ref_user_id != user_id:
-                if database.update_referral_bonus(ref_user_id, user_id):
-                    database.update_balance(ref_user_id, REFERRAL_BONUS, f"Referral bonus")
-                    
-                    try:
-                        referer_balance = database.get_user_balance(ref_user_id)
-                        await context.bot.send_message(
-                            chat_id=ref_user_id,
-                            text=f"🎉 Yangi foydalanuvchi (@{username}) qo‘shildi! +{REFERRAL_BONUS} so‘m. Balans: {referer_balance} so‘m."
-                        )
-                    except Exception as e:
-                        logger.error(f"Referral message error: {e}")
+                referer_balance = await database.credit_referral(ref_user_id, user_id, REFERRAL_BONUS)
+                if referer_balance is not None:
+                    # Bildirishnoma kutilmaydi - foydalanuvchining o'z javobi oldinda
+                    outbox.post(
+                        ref_user_id, context.bot.send_message,
+                        chat_id=ref_user_id,
+                        text=f"🎉 Yangi foydalanuvchi (@{username}) qo‘shildi! +{REFERRAL_BONUS} so‘m. Balans: {referer_balance} so‘m."
+                    )
         except Exception as e:
             logger.error(f"Referral error: {e}")
 
     if not user_data.get("start_bonus_given", 0):
-        asyncio.create_task(give_start_bonus(user_id, context))
+        await bonus_scheduler.schedule(user_id, START_BONUS_DELAY)
 
-    text = (
-        "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
-        "🔥 *Premium bonuslar* va har hafta yangi yutuqlar!\n"
-        "📊 *Signal xizmati* va *kunlik kuponlar*\n\n"
-        "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
-    )
-    
-    await update.message.reply_text(
-        text,
+    await reply(
+        update, update.message.reply_text,
+        WELCOME_TEXT,
         parse_mode="Markdown",
-        reply_markup=get_main_keyboard()
+        reply_markup=MAIN_KEYBOARD
     )
 
-async def give_start_bonus(user_id: int, context: ContextTypes.DEFAULT_TYPE):
-    await asyncio.sleep(90)
-    
-    user_data = await database.get_user(user_id)
-    
-    if not user_data.get("start_bonus_given", 0):
-        database.update_balance(user_id, START_BONUS, "Start bonus")
-        
-        db_path = database.get_db_path()
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET start_bonus_given = 1 WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
-        
-        try:
-            new_balance = database.get_user_balance(user_id)
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🎉 Start bonusi: {START_BONUS} so‘m! Balans: {new_balance} so‘m."
-            )
-        except Exception as e:
-            logger.error(f"Bonus message error: {e}")
+async def notify_start_bonus(bot, paid: list):
+    """To'langan start bonuslari haqida xabar yuborish (javoblardan keyingi navbatda)"""
+    for user_id, balance in paid:
+        outbox.post(
+            user_id, bot.send_message,
+            chat_id=user_id,
+            text=f"🎉 Start bonusi: {START_BONUS} so‘m! Balans: {balance} so‘m."
+        )
 
 # ------------------- BOSHQA HANDLERLAR -------------------
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    text = "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
-    await query.message.reply_text(
-        text,
+    await reply(
+        update, query.message.reply_text,
+        MAIN_MENU_TEXT,
         parse_mode="Markdown",
-        reply_markup=get_main_keyboard()
+        reply_markup=MAIN_KEYBOARD
     )
 
 async def show_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    if not games_data:
-        await query.edit_message_text(
+    if not catalog:
+        await reply(
+            update, query.edit_message_text,
             "Hozircha kunlik stavkalar mavjud emas.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]])
+            reply_markup=BACK_KEYBOARD
         )
         return
     text = "📊 *Bugungi kun stavkalari:*"
-    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=get_game_keyboard())
+    await reply(update, query.edit_message_text, text, parse_mode="Markdown", reply_markup=get_game_keyboard())
 
 async def game_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     game_name = query.data.replace("game_", "")
-    game = games_data.get(game_name)
+    game = catalog.get(game_name)
     if not game:
-        await query.message.reply_text("Topilmadi.")
+        await reply(update, query.message.reply_text, "Topilmadi.")
         return
 
-    game["views"] = game.get("views", 0) + 1
-    save_games(games_data)
+    view_counter.hit(game_name, query.from_user.id)
 
-    text = game.get("text", "Maʼlumot yo'q")
+    text = game.get("text") or "Maʼlumot yo'q"
     photo_id = game.get("photo_id")
     file_id = game.get("file_id")
-    button_text = game.get("button_text")
-    button_url = game.get("button_url")
-
-    back_button = [[InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]]
-    reply_markup = InlineKeyboardMarkup(back_button)
-    
-    if button_text and button_url:
-        keyboard = [[InlineKeyboardButton(button_text, url=button_url)], back_button[0]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_game_markup(game_name, game)
 
+    # Hammasi bitta chat navbatida - tartib saqlanadi, hujjatni alohida kutish shart emas
+    sends = []
     if file_id:
-        await query.message.reply_document(document=file_id)
+        sends.append(reply(update, query.message.reply_document, document=file_id))
 
     if photo_id:
-        await query.message.reply_photo(photo=photo_id, caption=text, parse_mode="HTML", reply_markup=reply_markup)
+        sends.append(reply(update, query.message.reply_photo, photo=photo_id, caption=text, parse_mode="HTML", reply_markup=reply_markup))
     else:
-        await query.message.reply_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        sends.append(reply(update, query.message.reply_text, text, parse_mode="HTML", reply_markup=reply_markup))
+    await asyncio.gather(*sends)
 
 async def earn_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -217,10 +263,10 @@ async def earn_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     share_url = f"https://t.me/share/url?url={referral_link}"
     keyboard = [
         [InlineKeyboardButton("📤 Ulashish", url=share_url)],
-        [InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
+        [WITHDRAW_BUTTON],
+        [BACK_BUTTON]
     ]
-    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+    await reply(update, query.edit_message_text, text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def balance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -238,11 +284,7 @@ async def balance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Takliflar: *{referrals}*\n\n"
         f"Minimal yechish: {MIN_WITHDRAW} so‘m."
     )
-    keyboard = [
-        [InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
-    ]
-    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+    await reply(update, query.edit_message_text, text, parse_mode="Markdown", reply_markup=BALANCE_KEYBOARD)
 
 async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -254,9 +296,10 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     balance = user_data.get("balance", 0)
 
     if balance < MIN_WITHDRAW:
-        await query.edit_message_text(
+        await reply(
+            update, query.edit_message_text,
             f"❌ Minimal balans {MIN_WITHDRAW} so‘m. Sizda {balance} so‘m.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]])
+            reply_markup=BACK_KEYBOARD
         )
         return
 
@@ -266,43 +309,134 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Sizning kodingiz: `{code}`\n"
         f"Saytga o‘ting va kodni kiriting."
     )
-    keyboard = [
-        [InlineKeyboardButton("💳 Saytga o‘tish", url=WITHDRAW_SITE_URL)],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
-    ]
-    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+    await reply(update, query.edit_message_text, text, parse_mode="Markdown", reply_markup=WITHDRAW_KEYBOARD)
+
+# ------------------- BALANS TARIXI -------------------
+HISTORY_PAGE_SIZE = 10
+
+async def history_page(user_id: int, before_id: int = None):
+    """Tarix sahifasi matni va klaviaturasi (keyingi sahifa - oxirgi yozuv id si bo'yicha)"""
+    rows = await database.get_balance_history(user_id, before_id, HISTORY_PAGE_SIZE + 1)
+    has_more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    lines = ["📜 Balans tarixi:\n"]
+    for _, amount, new_balance, reason, created_at in rows:
+        lines.append(f"{created_at}  {amount:+} so‘m → {new_balance}" + (f" ({reason})" if reason else ""))
+    if not has_more:
+        # Tezkor bazadagi yozuvlar tugadi - arxivlangan oylar yig'indisi
+        months = await database.get_monthly_history(user_id)
+        if months:
+            lines.append("\nOldingi oylar:")
+            lines.extend(f"{month}: {amount:+} so‘m, {entries} ta amal" for month, amount, entries in months)
+    if len(lines) == 1:
+        lines.append("Hozircha o'zgarishlar yo'q.")
+    keyboard = []
+    if has_more:
+        keyboard.append([InlineKeyboardButton("⏪ Oldingilar", callback_data=f"history_{rows[-1][0]}")])
+    keyboard.append([BACK_BUTTON])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text, markup = await history_page(update.effective_user.id)
+    await reply(update, update.message.reply_text, text, reply_markup=markup)
+
+async def history_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, _, before_id = query.data.partition("_")
+    if before_id and not before_id.isdecimal():
+        # Soxta yoki eski formatdagi callback_data
+        await query.answer("Sahifa eskirgan, /history ni qayta oching.")
+        return
+    await query.answer()
+    text, markup = await history_page(query.from_user.id, int(before_id) if before_id else None)
+    await reply(update, query.edit_message_text, text, reply_markup=markup)
+
+# ------------------- REFERRAL REYTINGI -------------------
+TOP_PERIODS = {
+    "kun": ("day", "Bugungi"),
+    "day": ("day", "Bugungi"),
+    "hafta": ("week", "Haftalik"),
+    "week": ("week", "Haftalik"),
+}
+
+async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/top [kun|hafta] - eng ko'p taklif qilganlar"""
+    period, title = TOP_PERIODS.get((context.args or [""])[0].lower(), ("all", "Umumiy"))
+    top = await database.get_top_referrers(period, limit=10)
+    if not top:
+        await reply(update, update.message.reply_text, "Hozircha takliflar yo'q.")
+        return
+    lines = [f"🏆 *{title} top referrerlar:*\n"]
+    for place, (user_id, username, count) in enumerate(top, 1):
+        name = escape_markdown(username or str(user_id))
+        lines.append(f"{place}. {name} - *{count}*")
+    await reply(update, update.message.reply_text, "\n".join(lines), parse_mode="Markdown")
+
+async def tree_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/tree <user_id> - foydalanuvchining referral daraxti (admin)"""
+    if not is_admin(update.effective_user.id):
+        await reply(update, update.message.reply_text, "Siz admin emassiz.")
+        return
+    try:
+        user_id = int(context.args[0])
+    except (IndexError, ValueError):
+        await reply(update, update.message.reply_text, "Foydalanish: /tree <user_id>")
+        return
+    tree = await database.get_referral_tree(user_id)
+    lines = [f"🌳 Referral daraxti: {user_id}"]
+    if tree["upline"]:
+        lines.append("Yuqorida: " + " ← ".join(f"{ref_id} (@{name})" for ref_id, name in tree["upline"]))
+    for depth, count in tree["levels"]:
+        lines.append(f"{depth}-daraja: {count}")
+    if tree["truncated"]:
+        lines.append("(daraxt katta - hisob cheklangan)")
+    if tree["recent"]:
+        lines.append("\nOxirgi takliflar:")
+        for ref_id, name, referrals, created_at in tree["recent"]:
+            lines.append(f"{ref_id} @{name} - {referrals} taklif, {created_at}")
+    elif not tree["levels"]:
+        lines.append("Takliflar yo'q.")
+    await reply(update, update.message.reply_text, "\n".join(lines))
 
 # ------------------- ADMIN CALLBACKS -------------------
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("Siz admin emassiz.")
+        await reply(update, update.message.reply_text, "Siz admin emassiz.")
         return
-    await update.message.reply_text("👨‍💻 Admin paneli:", reply_markup=get_admin_keyboard())
+    await reply(update, update.message.reply_text, "👨‍💻 Admin paneli:", reply_markup=ADMIN_KEYBOARD)
 
 async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     if not is_admin(query.from_user.id):
-        await query.edit_message_text("Siz admin emassiz.")
+        await reply(update, query.edit_message_text, "Siz admin emassiz.")
         return
 
     data = query.data
 
     if data == "admin_stats":
-        if not games_data:
-            await query.edit_message_text("Maʼlumot yo‘q.")
+        # Bazadan o'qiladi - multi-process rejimda katalog nusxasi faqat shu worker ko'rishlarini biladi.
+        # O'z hisoblagichimiz avval yoziladi; boshqa worker lar VIEWS_FLUSH_INTERVAL da yozadi
+        try:
+            await view_counter.flush()
+        except Exception as e:
+            logger.error(f"Game views flush error: {e}")
+        views = await database.get_game_view_stats()
+        if not views:
+            await reply(update, query.edit_message_text, "Maʼlumot yo‘q.")
             return
-        lines = ["📊 Statistika:"]
-        total = 0
-        for name, game in games_data.items():
-            views = game.get("views", 0)
-            lines.append(f"• {name}: {views} marta")
-            total += views
-        lines.append(f"\nJami: {total} marta")
-        await query.edit_message_text("\n".join(lines), reply_markup=get_admin_keyboard())
+        lines = ["📊 Statistika (jami | 24 soat | 7 kun, noyob ≈):"]
+        for name, game in views.items():
+            lines.append(
+                f"• {name}: {game['views']} | {game['views_24h']} ({game['uniques_24h']}) "
+                f"| {game['views_7d']} ({game['uniques_7d']})"
+            )
+        stats = await database.get_all_users_count()
+        lines.append(f"\nJami: {stats['total_views']} marta")
+        await reply(update, query.edit_message_text, "\n".join(lines), reply_markup=ADMIN_KEYBOARD)
     
     elif data == "admin_users_count":
-        stats = database.get_all_users_count()
+        stats = await database.get_all_users_count()
         stats_text = (
             f"👥 *Foydalanuvchilar*\n\n"
             f"Jami: *{stats['total']}*\n"
@@ -310,77 +444,203 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
             f"Referral: *{stats['referred']}*\n"
             f"Umumiy balans: *{stats['total_balance']} so‘m*"
         )
-        await query.edit_message_text(stats_text, parse_mode="Markdown", reply_markup=get_admin_keyboard())
+        await reply(update, query.edit_message_text, stats_text, parse_mode="Markdown", reply_markup=ADMIN_KEYBOARD)
+
+    elif data == "admin_cache":
+        stats = database.profile_cache.stats()
+        cache_text = (
+            f"🗂 *Profil keshi*\n\n"
+            f"Hajmi: *{stats['size']}* / {stats['max_size']}\n"
+            f"Hit: *{stats['hits']}*\n"
+            f"Miss: *{stats['misses']}*\n"
+            f"Hit rate: *{stats['hit_rate']:.1%}*"
+        )
+        await reply(update, query.edit_message_text, cache_text, parse_mode="Markdown", reply_markup=ADMIN_KEYBOARD)
+
+    elif data == "admin_metrics":
+        await reply(update, query.edit_message_text, metrics_summary(), reply_markup=ADMIN_KEYBOARD)
 
     elif data == "admin_close":
-        await query.edit_message_text("Panel yopildi.")
+        await reply(update, query.edit_message_text, "Panel yopildi.")
 
     elif data == "admin_back":
-        await query.edit_message_text("Admin paneli:", reply_markup=get_admin_keyboard())
+        await reply(update, query.edit_message_text, "Admin paneli:", reply_markup=ADMIN_KEYBOARD)
+
+def metrics_summary(limit: int = 6) -> str:
+    """Admin panel uchun eng sekin handler va so'rovlar"""
+    lines = ["📈 Metrics (p50 / p99, ms)"]
+    for title, histogram, errors in (
+        ("Handlerlar", metrics.handler_seconds, metrics.handler_errors),
+        ("DB so'rovlar", metrics.db_query_seconds, metrics.db_query_errors),
+    ):
+        lines.append(f"\n{title}:")
+        summary = sorted(histogram.summary().items(), key=lambda item: item[1]["avg"], reverse=True)
+        for (label,), stats in summary[:limit]:
+            lines.append(
+                f"• {label}: {stats['count']} ta, {stats['p50'] * 1000:g} / {stats['p99'] * 1000:g}"
+                f", xato {errors.get(label):g}"
+            )
+    sends = {labels[0]: value for labels, value in metrics.broadcast_sends.items()}
+    lines.append(f"\nBroadcast: {sends or '-'}, {metrics.broadcast_rate.get():.1f} xabar/s")
+    lines.append(f"Navbatdagi bonuslar: {metrics.scheduled_bonuses.get():g}")
+    return "\n".join(lines)
 
 # ------------------- BROADCAST -------------------
-BROADCAST_MSG = 100
+BROADCAST_MSG, BROADCAST_SEGMENT, BROADCAST_PARAM = 100, 101, 102
+
+# segment: (tugma matni, parametr so'rovi yoki None)
+BROADCAST_SEGMENTS = {
+    "all": ("👥 Barchasi", None),
+    "referred": ("🔗 Taklif orqali kelganlar", None),
+    "bonus": ("🎁 Start bonus olganlar", None),
+    "balance": ("💰 Balansi kamida ...", "Minimal balansni kiriting (so‘m):"),
+    "joined": ("📅 Qo‘shilgan sana oralig‘i", "Sana oralig‘ini kiriting: `YYYY-MM-DD YYYY-MM-DD`"),
+    "top_referrers": ("🏆 Top taklif qiluvchilar", "Nechta foydalanuvchi? (masalan, 100)"),
+}
+
+BROADCAST_SEGMENT_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(label, callback_data=f"bseg_{segment}")] for segment, (label, _) in BROADCAST_SEGMENTS.items()]
+)
+
+def parse_segment_param(segment: str, text: str) -> dict:
+    """Admin kiritgan matndan snapshot_audience parametrlari (xato bo'lsa ValueError)"""
+    if segment == "balance":
+        return {"min_balance": int(text)}
+    if segment == "joined":
+        since, until = (date.fromisoformat(part) for part in text.split())
+        if until < since:
+            raise ValueError("empty range")
+        # Oxirgi kun ham kiradi: created_at < keyingi kun
+        return {"since": since.isoformat(), "until": (until + timedelta(days=1)).isoformat()}
+    if segment == "top_referrers":
+        limit = int(text)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        return {"limit": limit}
+    return {}
 
 async def admin_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     if not is_admin(query.from_user.id):
-        await query.edit_message_text("Siz admin emassiz.")
+        await reply(update, query.edit_message_text, "Siz admin emassiz.")
         return ConversationHandler.END
 
-    await query.edit_message_text(
-        "📨 *Barchaga yuboriladigan xabarni kiriting:*\n\n/cancel - bekor qilish",
-        parse_mode="Markdown"
+    await reply(
+        update, query.edit_message_text,
+        "📨 *Kimga yuboramiz?*\n\n/cancel - bekor qilish",
+        parse_mode="Markdown",
+        reply_markup=BROADCAST_SEGMENT_KEYBOARD
+    )
+    return BROADCAST_SEGMENT
+
+async def ask_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE, method):
+    audience = context.user_data["broadcast"]
+    total = await database.count_audience(audience["segment"], **audience["params"])
+    if not total:
+        await reply(update, method, "📭 Bu segmentda faol foydalanuvchi yo‘q.", reply_markup=ADMIN_KEYBOARD)
+        context.user_data.pop("broadcast", None)
+        return ConversationHandler.END
+    label = BROADCAST_SEGMENTS[audience["segment"]][0]
+    await reply(
+        update, method,
+        f"📨 {label}: {total} ta foydalanuvchi.\n\nYuboriladigan xabarni kiriting:\n/cancel - bekor qilish"
     )
     return BROADCAST_MSG
 
+async def broadcast_segment_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    segment = query.data[len("bseg_"):]
+    if not is_admin(query.from_user.id) or segment not in BROADCAST_SEGMENTS:
+        return ConversationHandler.END
+
+    context.user_data["broadcast"] = {"segment": segment, "params": {}}
+    prompt = BROADCAST_SEGMENTS[segment][1]
+    if prompt:
+        await reply(update, query.edit_message_text, f"{prompt}\n\n/cancel - bekor qilish", parse_mode="Markdown")
+        return BROADCAST_PARAM
+    return await ask_broadcast_message(update, context, query.edit_message_text)
+
+async def broadcast_param(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id) or "broadcast" not in context.user_data:
+        return ConversationHandler.END
+
+    audience = context.user_data["broadcast"]
+    try:
+        audience["params"] = parse_segment_param(audience["segment"], update.message.text.strip())
+    except ValueError:
+        await reply(update, update.message.reply_text, "❌ Noto‘g‘ri qiymat, qaytadan kiriting yoki /cancel.")
+        return BROADCAST_PARAM
+    return await ask_broadcast_message(update, context, update.message.reply_text)
+
 async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("Siz admin emassiz.")
+        await reply(update, update.message.reply_text, "Siz admin emassiz.")
         return ConversationHandler.END
 
     message = update.message
-    users = database.get_all_users()
-    
-    success_count = 0
-    fail_count = 0
-    
-    status_msg = await update.message.reply_text(
-        f"📨 Xabar yuborilmoqda...\nJami: {len(users)}"
+    audience = context.user_data.pop("broadcast", None) or {"segment": "all", "params": {}}
+    if not message.text and not message.photo:
+        await reply(update, message.reply_text, "❌ Faqat matn yoki rasm yuborish mumkin.", reply_markup=ADMIN_KEYBOARD)
+        return ConversationHandler.END
+
+    total = await database.count_audience(audience["segment"], **audience["params"])
+    status_msg = await reply(
+        update, message.reply_text,
+        f"📨 Xabar yuborilmoqda...\nJami: {total}"
     )
+    # Uzoq davom etadi - update larni qayta ishlashni to'sib qo'ymaslik uchun fonda
+    context.application.create_task(run_broadcast(context, message, audience, total, status_msg))
+    return ConversationHandler.END
 
-    for (user_id,) in users:
-        try:
-            if message.text:
-                await context.bot.send_message(chat_id=user_id, text=message.text)
-            elif message.photo:
-                await context.bot.send_photo(chat_id=user_id, photo=message.photo[-1].file_id, caption=message.caption)
-            else:
-                fail_count += 1
-                continue
-            
-            success_count += 1
-            
-            if (success_count + fail_count) % 10 == 0:
-                await status_msg.edit_text(
-                    f"📨 Yuborilmoqda...\n✅ {success_count}\n❌ {fail_count}\nJami: {len(users)}"
-                )
-                
-        except Exception as e:
-            fail_count += 1
-            logger.error(f"Broadcast error: {e}")
+async def run_broadcast(context: ContextTypes.DEFAULT_TYPE, message, audience: dict, total: int, status_msg):
+    async def send(user_id: int):
+        if message.text:
+            await context.bot.send_message(chat_id=user_id, text=message.text)
+        else:
+            await context.bot.send_photo(chat_id=user_id, photo=message.photo[-1].file_id, caption=message.caption)
+
+    async def report(broadcaster: Broadcaster):
+        success_count = broadcaster.stats.get(broadcast.OK, 0)
+        await status_msg.edit_text(
+            f"📨 Yuborilmoqda...\n✅ {success_count}\n❌ {broadcaster.done - success_count}\nJami: {total}"
+        )
+
+    broadcast_id = await database.create_broadcast(message.from_user.id, total)
+    # Auditoriya boshida qotiriladi - yuborish davomida segment o'zgarsa ham takror/tushib qolish yo'q
+    total = await database.snapshot_audience(broadcast_id, audience["segment"], **audience["params"])
+    ledger = DeliveryLedger(broadcast_id)
+
+    def on_result(user_id: int, status: str, error: Exception):
+        ledger.add(user_id, status, error)
+        if status in (broadcast.FAILED, broadcast.RATE_LIMITED):
+            logger.error(f"Broadcast error ({status}) {user_id}: {error}")
+
+    broadcaster = Broadcaster(
+        rate=BROADCAST_RATE,
+        concurrency=BROADCAST_CONCURRENCY,
+        progress_interval=BROADCAST_PROGRESS_INTERVAL,
+        global_bucket=outbox.bucket,
+        reserve=BROADCAST_RESERVE,
+    )
+    try:
+        stats = await broadcaster.run(database.iter_audience(broadcast_id), send, report, on_result)
+    finally:
+        await ledger.close()
+        await database.drop_audience(broadcast_id)
+    success_count = stats.get(broadcast.OK, 0)
+    await database.finish_broadcast(broadcast_id, success_count, broadcaster.done - success_count)
 
     await status_msg.edit_text(
-        f"📨 *Yakunlandi!*\n\n✅ {success_count}\n❌ {fail_count}\n👥 Jami: {len(users)}",
+        f"📨 *Yakunlandi!*\n\n✅ {success_count}\n❌ {broadcaster.done - success_count}\n👥 Jami: {total}",
         parse_mode="Markdown",
-        reply_markup=get_admin_keyboard()
+        reply_markup=ADMIN_KEYBOARD
     )
-    
-    return ConversationHandler.END
 
 async def broadcast_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    await update.message.reply_text("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
+    await reply(update, update.message.reply_text, "❌ Bekor qilindi.", reply_markup=ADMIN_KEYBOARD)
     return ConversationHandler.END
 
 # ------------------- ADD GAME (qisqartirilgan) -------------------
@@ -394,19 +654,19 @@ async def admin_add_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     context.user_data.clear()
     context.user_data["add_game"] = {}
-    await query.edit_message_text("Yangi kun stavkasi nomini kiriting:")
+    await reply(update, query.edit_message_text, "Yangi kun stavkasi nomini kiriting:")
     return ADD_NAME
 
 async def add_game_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = update.message.text.strip()
     if not name:
-        await update.message.reply_text("Qayta kiriting:")
+        await reply(update, update.message.reply_text, "Qayta kiriting:")
         return ADD_NAME
-    if name in games_data:
-        await update.message.reply_text("Bu nom mavjud. Boshqa nom kiriting:")
+    if name in catalog:
+        await reply(update, update.message.reply_text, "Bu nom mavjud. Boshqa nom kiriting:")
         return ADD_NAME
     context.user_data["add_game"]["name"] = name
-    await update.message.reply_text("Matnni kiriting (HTML):")
+    await reply(update, update.message.reply_text, "Matnni kiriting (HTML):")
     return ADD_TEXT
 
 # Qolgan ADD GAME funksiyalari shu yerda davom etadi...
@@ -414,38 +674,154 @@ async def add_game_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def add_game_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    await update.message.reply_text("Bekor qilindi.", reply_markup=get_admin_keyboard())
+    await reply(update, update.message.reply_text, "Bekor qilindi.", reply_markup=ADMIN_KEYBOARD)
     return ConversationHandler.END
 
+# ------------------- CALLBACK ROUTER -------------------
+def build_callback_router() -> CallbackRouter:
+    router = CallbackRouter()
+    router.exact("show_games", show_games)
+    router.prefix("game_", game_callback)
+    router.exact("earn", earn_callback)
+    router.exact("balance", balance_callback)
+    router.exact("withdraw", withdraw_callback)
+    router.exact("history", history_callback)
+    router.prefix("history_", history_callback)
+    router.exact("main_menu", back_to_main)
+    for route in ("admin_stats", "admin_users_count", "admin_cache", "admin_metrics", "admin_close", "admin_back"):
+        router.exact(route, admin_callback_handler)
+    return router
+
+# ------------------- HTTP (HEALTH / WEBHOOK) -------------------
+http_server = WebServer(port=PORT)
+started_at = time.monotonic()
+
+async def health(request: Request) -> Response:
+    try:
+        await asyncio.wait_for(database.ping(), timeout=2)
+        db_ok = True
+    except Exception as e:
+        logger.error(f"Health check database error: {e}")
+        db_ok = False
+    return Response.json({
+        "status": "ok" if db_ok else "degraded",
+        "mode": BOT_MODE,
+        "database": db_ok,
+        "uptime": int(time.monotonic() - started_at),
+    }, status=200 if db_ok else 503)
+
+def make_webhook_handler(app: Application):
+    async def webhook(request: Request) -> Response:
+        if WEBHOOK_SECRET and request.headers.get("x-telegram-bot-api-secret-token") != WEBHOOK_SECRET:
+            return Response.text("forbidden", 403)
+        try:
+            update = Update.de_json(request.json(), app.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            update = None
+        if update is None:
+            return Response.text("bad update", 400)
+        # Qayta ishlash Application ichida (concurrent_updates) - Telegram ga darhol javob
+        await app.update_queue.put(update)
+        return Response.text("ok")
+    return webhook
+
+async def metrics_endpoint(request: Request) -> Response:
+    metrics.pending_views.set(value=sum(view_counter.pending.values()))
+    return Response(200, metrics.REGISTRY.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+
+async def run_webhook(app: Application):
+    """run_polling o'rniga: o'z HTTP serverimiz update larni qabul qiladi"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    if WEBHOOK_URL:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(f"Webhook set: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    try:
+        await stop.wait()
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
+
 # ------------------- ASOSIY -------------------
-def main():
-    # Database ni ishga tushirish
-    database.init_database()
-    
-    # Eski JSON ma'lumotlarni ko'chirish
-    database.migrate_from_json()
-    
-    # Bot ni ishga tushirish
-    app = Application.builder().token(TOKEN).build()
+async def start_services(app: Application, scheduler: bool = True):
+    await catalog.load()
+    catalog.start(CATALOG_POLL_INTERVAL)
+    outbox.start()
+    view_counter.start()
+    if scheduler:
+        bonus_scheduler.start(functools.partial(notify_start_bonus, app.bot))
+        history_compactor.start()
+
+async def stop_services():
+    await catalog.stop()
+    await bonus_scheduler.stop()
+    await history_compactor.stop()
+    await outbox.stop()
+    await view_counter.stop()
+
+async def post_init(app: Application):
+    await start_services(app)
+    if HTTP_SERVER_ENABLED:
+        http_server.route("GET", "/", health)
+        http_server.route("GET", "/metrics", metrics_endpoint)
+        if BOT_MODE == "webhook":
+            http_server.route("POST", WEBHOOK_PATH, make_webhook_handler(app))
+        await http_server.start()
+
+async def post_shutdown(app: Application):
+    await http_server.stop()
+    await stop_services()
+    database.close_database()
+
+def build_application(request=None) -> Application:
+    """Application yaratib, barcha handlerlarni ro'yxatdan o'tkazish"""
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(UpdateLimiter(
+            CONCURRENT_UPDATES, RATE_LIMIT_RATE, RATE_LIMIT_BURST, MAX_WAITING_UPDATES, exempt=(ADMIN_ID,)
+        ))
+        .persistence(SQLitePersistence(PERSISTENCE_INTERVAL))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    app = builder.build()
 
     # Handlerlar
     app.add_handler(CommandHandler("start", start))
-    app.add_handler(CallbackQueryHandler(show_games, pattern="^show_games$"))
-    app.add_handler(CallbackQueryHandler(game_callback, pattern="^game_"))
-    app.add_handler(CallbackQueryHandler(earn_callback, pattern="^earn$"))
-    app.add_handler(CallbackQueryHandler(balance_callback, pattern="^balance$"))
-    app.add_handler(CallbackQueryHandler(withdraw_callback, pattern="^withdraw$"))
-    app.add_handler(CallbackQueryHandler(back_to_main, pattern="^main_menu$"))
-    
-    # Admin
     app.add_handler(CommandHandler("admin", admin_panel))
-    app.add_handler(CallbackQueryHandler(admin_callback_handler, pattern="^(admin_stats|admin_users_count|admin_close|admin_back)$"))
+    app.add_handler(CommandHandler("history", history_command))
+    app.add_handler(CommandHandler("top", top_command))
+    app.add_handler(CommandHandler("tree", tree_command))
+    # Oddiy callback lar bitta router orqali (suhbat kirish nuqtalari alohida)
+    router = build_callback_router()
+    app.add_handler(CallbackQueryHandler(router, pattern=router.matches))
     
     # Broadcast
     broadcast_conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(admin_broadcast_callback, pattern="^admin_broadcast$")],
-        states={BROADCAST_MSG: [MessageHandler(filters.ALL & ~filters.COMMAND, broadcast_message)]},
+        states={
+            BROADCAST_SEGMENT: [CallbackQueryHandler(broadcast_segment_callback, pattern="^bseg_")],
+            BROADCAST_PARAM: [MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_param)],
+            BROADCAST_MSG: [MessageHandler(filters.ALL & ~filters.COMMAND, broadcast_message)],
+        },
         fallbacks=[CommandHandler("cancel", broadcast_cancel)],
+        name="broadcast",
+        persistent=True,
     )
     app.add_handler(broadcast_conv)
     
@@ -457,11 +833,119 @@ def main():
             # ... qolgan state lar
         },
         fallbacks=[CommandHandler("cancel", add_game_cancel)],
+        name="add_game",
+        persistent=True,
     )
     app.add_handler(add_conv)
 
-    logger.info("✅ Bot started!")
-    app.run_polling()
+    # Har bir handler vaqti, chaqiruvlar va xatolar soni (/metrics)
+    metrics.instrument_application(app)
+
+    return app
+
+# ------------------- MULTI-PROCESS (INGRESS / WORKER) -------------------
+update_queue = None
+worker_pool = None
+
+def get_update_queue_path() -> str:
+    return UPDATE_QUEUE_FILE or os.path.join(os.path.dirname(os.path.abspath(database.get_db_path())), "update_queue.db")
+
+async def enqueue_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ingress: update ni foydalanuvchi shardiga yozish (qayta ishlash worker larda)"""
+    user = update.effective_user
+    await update_queue.put([(user.id if user else 0, UPDATE, json.dumps(update.to_dict()))])
+
+async def queue_metrics_endpoint(request: Request) -> Response:
+    for shard in range(update_queue.shards):
+        metrics.update_queue_depth.set(str(shard), value=0)
+    for shard, depth in (await update_queue.depth()).items():
+        metrics.update_queue_depth.set(str(shard), value=depth)
+    return await metrics_endpoint(request)
+
+async def ingress_post_init(app: Application):
+    worker_pool.start()
+    if HTTP_SERVER_ENABLED:
+        http_server.route("GET", "/", health)
+        http_server.route("GET", "/metrics", queue_metrics_endpoint)
+        if BOT_MODE == "webhook":
+            http_server.route("POST", WEBHOOK_PATH, make_webhook_handler(app))
+        await http_server.start()
+
+async def ingress_post_shutdown(app: Application):
+    await http_server.stop()
+    await worker_pool.stop()
+    update_queue.close()
+    database.close_database()
+
+def build_ingress_application() -> Application:
+    """Faqat update qabul qilib navbatga yozuvchi Application.
+
+    Update lar ketma-ket (concurrent_updates o'chiq) yoziladi - bitta
+    foydalanuvchi update lari navbatda kelgan tartibida qoladi.
+    """
+    global update_queue, worker_pool
+    update_queue = UpdateQueue(get_update_queue_path(), WORKERS)
+    worker_pool = WorkerPool(run_worker, WORKERS, (get_update_queue_path(),))
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        # Faqat foydalanuvchi cheklovi: 1 ta slot - update lar tartibi saqlanadi
+        .concurrent_updates(UpdateLimiter(1, RATE_LIMIT_RATE, RATE_LIMIT_BURST, exempt=(ADMIN_ID,)))
+        .post_init(ingress_post_init)
+        .post_shutdown(ingress_post_shutdown)
+        .build()
+    )
+    app.add_handler(TypeHandler(Update, enqueue_update))
+    return app
+
+def run_worker(shard: int, shards: int, queue_path: str, db_path: str = None, request=None):
+    """Worker jarayoni kirish nuqtasi (WorkerPool spawn qiladi)"""
+    asyncio.run(_run_worker(shard, shards, queue_path, db_path, request))
+
+async def _run_worker(shard: int, shards: int, queue_path: str, db_path: str, request):
+    database.open_database(db_path)
+    worker_queue = UpdateQueue(queue_path, shards)
+    # Har worker o'z Outbox iga ega - umumiy OUTBOX_RATE/OUTBOX_BURST jarayonlar orasida bo'linadi
+    outbox.bucket.split(shards)
+    app = build_application(request)
+    consumer = ShardConsumer(app, worker_queue, shard, concurrency=CONCURRENT_UPDATES)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, consumer.stop)
+
+    await app.initialize()
+    # Bonus rejalashtiruvchi bitta (0-) worker da ishlaydi
+    await start_services(app, scheduler=shard == 0)
+    await app.start()
+    logger.info(f"Worker {shard}/{shards} ready")
+    try:
+        await consumer.run()
+    finally:
+        await app.stop()
+        await stop_services()
+        await app.shutdown()
+        worker_queue.close()
+        database.close_database()
+
+def main():
+    # Database ni ishga tushirish
+    database.init_database()
+    
+    # Eski JSON ma'lumotlarni ko'chirish
+    database.migrate_from_json()
+    database.import_games_from_json()
+    
+    # Bot ni ishga tushirish
+    if WORKERS > 0:
+        app = build_ingress_application()
+    else:
+        app = build_application()
+
+    logger.info(f"✅ Bot started ({BOT_MODE}, workers: {WORKERS or 'off'})!")
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterable, Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Yuborish natijalari
+OK = "ok"
+FORBIDDEN = "forbidden"
+CHAT_NOT_FOUND = "chat_not_found"
+RATE_LIMITED = "rate_limited"
+FAILED = "failed"
+
+
+class TokenBucket:
+    """Global tezlik cheklovchi: sekundiga `rate` ta, `capacity` tagacha portlash"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def split(self, parts: int):
+        """Limitni `parts` ta jarayon orasida teng bo'lish - bu bucket faqat o'z ulushini beradi"""
+        self.rate /= parts
+        self.capacity = max(1.0, self.capacity / parts)
+        self._tokens = min(self._tokens, self.capacity)
+
+    async def acquire(self, reserve: float = 0):
+        """Token olish; `reserve` tokendan kami qolsa kutadi (past ustuvorlikdagi iste'molchi uchun)"""
+        if not self.rate:
+            return
+        needed = 1 + min(reserve, self.capacity - 1)
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= needed:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """Doimiy xatolar uchun natija nomi, vaqtinchalik bo'lsa None"""
+    if isinstance(error, Forbidden):
+        return FORBIDDEN
+    if isinstance(error, BadRequest):
+        if "chat not found" in error.message.lower():
+            return CHAT_NOT_FOUND
+        return FAILED
+    if isinstance(error, NetworkError):
+        return None
+    return FAILED
+
+
+class Broadcaster:
+    """Cheklangan parallellik, token bucket va RetryAfter ni hisobga oluvchi yuboruvchi.
+
+    `send(chat_id)` har bir foydalanuvchiga xabar yuboradi. RetryAfter kelsa
+    shu chat `retry_after` soniyadan keyin qayta navbatga qo'yiladi, tarmoq
+    xatolari esa eksponensial kutish bilan `max_retries` martagacha takrorlanadi.
+    `global_bucket` berilsa (Outbox.bucket) har xabar undan ham token oladi,
+    lekin unda `reserve` tadan kam token qolganda kutadi - javoblar oldin chiqadi.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30,
+        concurrency: int = 25,
+        max_retries: int = 3,
+        progress_interval: float = 5.0,
+        retry_delay: float = 1.0,
+        global_bucket: Optional[TokenBucket] = None,
+        reserve: float = 0,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.global_bucket = global_bucket
+        self.reserve = reserve
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.retry_delay = retry_delay
+        self.stats: Dict[str, int] = {}
+        self.total = 0
+
+    @property
+    def done(self) -> int:
+        return sum(self.stats.values())
+
+    async def run(
+        self,
+        chat_ids: Union[Iterable[int], AsyncIterable[int]],
+        send: Callable[[int], Awaitable],
+        on_progress: Callable[["Broadcaster"], Awaitable] = None,
+        on_result: Callable[[int, str, Optional[Exception]], None] = None,
+    ) -> Dict[str, int]:
+        self.stats = {}
+        self.total = 0
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        outstanding = 0
+        feeding = True
+        finished = asyncio.Event()
+
+        def complete(chat_id: int, status: str, error: Exception = None):
+            nonlocal outstanding
+            self.stats[status] = self.stats.get(status, 0) + 1
+            metrics.broadcast_sends.inc(status)
+            if on_result is not None:
+                on_result(chat_id, status, error)
+            outstanding -= 1
+            if not feeding and outstanding == 0:
+                finished.set()
+
+        def retry_later(chat_id: int, attempt: int, delay: float):
+            asyncio.get_running_loop().call_later(
+                delay, lambda: asyncio.ensure_future(queue.put((chat_id, attempt)))
+            )
+
+        async def worker():
+            while True:
+                chat_id, attempt = await queue.get()
+                await self.bucket.acquire()
+                if self.global_bucket is not None:
+                    await self.global_bucket.acquire(self.reserve)
+                try:
+                    await send(chat_id)
+                except RetryAfter as e:
+                    if attempt >= self.max_retries:
+                        complete(chat_id, RATE_LIMITED, e)
+                    else:
+                        retry_later(chat_id, attempt + 1, e.retry_after)
+                except Exception as e:
+                    status = classify_error(e)
+                    if status is None and attempt < self.max_retries:
+                        retry_later(chat_id, attempt + 1, self.retry_delay * 2 ** attempt)
+                    else:
+                        complete(chat_id, status or FAILED, e)
+                else:
+                    complete(chat_id, OK)
+
+        started = time.monotonic()
+
+        def update_rate():
+            elapsed = time.monotonic() - started
+            if elapsed > 0:
+                metrics.broadcast_rate.set(value=self.done / elapsed)
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                update_rate()
+                try:
+                    await on_progress(self)
+                except Exception as e:
+                    logger.warning(f"Broadcast progress error: {e}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        progress_task = asyncio.create_task(reporter()) if on_progress else None
+        try:
+            # Async manba (iter_audience) navbat to'lganda o'qishni to'xtatadi - ro'yxat xotirada emas
+            if hasattr(chat_ids, "__aiter__"):
+                async for chat_id in chat_ids:
+                    outstanding += 1
+                    self.total += 1
+                    await queue.put((chat_id, 0))
+            else:
+                for chat_id in chat_ids:
+                    outstanding += 1
+                    self.total += 1
+                    await queue.put((chat_id, 0))
+            feeding = False
+            if outstanding:
+                await finished.wait()
+        finally:
+            update_rate()
+            for task in workers + [progress_task]:
+                if task is not None:
+                    task.cancel()
+            await asyncio.gather(*workers, *([progress_task] if progress_task else []), return_exceptions=True)
+        return self.stats
+
+
+class DeliveryLedger:
+    """Yuborish natijalarini yig'ib, deliveries jadvaliga partiyalab yozish"""
+
+    def __init__(self, broadcast_id: int, batch_size: int = 500):
+        self.broadcast_id = broadcast_id
+        self.batch_size = batch_size
+        self._rows = []
+        self._tasks = set()
+
+    def add(self, chat_id: int, status: str, error: Exception = None):
+        self._rows.append((chat_id, status, str(error) if error else None))
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        rows, self._rows = self._rows, []
+        task = asyncio.create_task(database.record_deliveries(self.broadcast_id, rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Qolgan natijalarni yozib, barcha yozuvlarni kutish"""
+        if self._rows:
+            self._flush()
+        await asyncio.gather(*self._tasks)
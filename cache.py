@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class TTLCache:
+    """Chegaralangan LRU kesh, har bir yozuv `ttl` soniya yashaydi"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # key o'zgarganda chaqiriladi (masalan, boshqa jarayonlar keshini bekor qilish uchun)
+        self.listener: Optional[Callable[[Any], None]] = None
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def update(self, key, **fields):
+        """Keshdagi dict qiymat maydonlarini yangilash (bo'lmasa hech narsa qilmaydi)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                item[1].update(fields)
+        if self.listener is not None:
+            self.listener(key)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.listener is not None:
+            self.listener(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
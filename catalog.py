@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+class GameCatalog:
+    """games jadvalining versiyalangan xotiradagi nusxasi.
+
+    Handlerlar faqat shu nusxadan o'qiydi. Katalogga yozuvchi har qanday
+    joy (database.add_game/update_game/delete_game, JSON import, boshqa
+    jarayon) o'sha tranzaksiyada meta.catalog_version ni oshiradi; har bir
+    jarayon `poll` da faqat versiyani o'qiydi va u o'zgargandagina katalogni
+    qayta yuklaydi. Ko'rishlar soni versiyani oshirmaydi (`apply_views`).
+    """
+
+    def __init__(self):
+        self.version = -1
+        self._games: Dict[str, dict] = {}
+        self._task = None
+
+    async def load(self):
+        """Katalogni bazadan to'liq o'qish"""
+        version, games = await database.get_games()
+        self._games = {game["name"]: game for game in games}
+        self.version = version
+
+    async def refresh(self) -> bool:
+        """Versiya o'zgargan bo'lsagina qayta yuklash"""
+        if await database.get_catalog_version() == self.version:
+            return False
+        await self.load()
+        return True
+
+    async def poll(self, interval: float):
+        """Boshqa jarayonlardagi admin o'zgarishlarini kuzatish (multi-process rejim)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Catalog refresh error: {e}")
+
+    def start(self, interval: float):
+        self._task = asyncio.create_task(self.poll(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get(self, name: str) -> Optional[dict]:
+        return self._games.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._games)
+
+    def items(self):
+        return self._games.items()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._games
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def apply_views(self, deltas: Dict[str, int]):
+        """Saqlangan ko'rishlarni nusxaga qo'shish (qayta yuklamasdan)"""
+        for name, count in deltas.items():
+            game = self._games.get(name)
+            if game is not None:
+                game["views"] = (game.get("views") or 0) + count
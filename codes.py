@@ -0,0 +1,60 @@
+import hashlib
+import hmac
+import math
+
+
+class CodePermutation:
+    """0..domain-1 oralig'idagi kalitli (Feistel) permutatsiya.
+
+    Ketma-ket tartib raqami (0, 1, 2, ...) takrorlanmaydigan, lekin
+    taxmin qilib bo'lmaydigan 7 xonali kodga aylanadi. Kalitni bilgan
+    holda `decode` kod qaysi tartib raqamidan chiqqanini qaytaradi.
+    """
+
+    def __init__(self, key: bytes, domain: int = 10 ** 7, rounds: int = 4):
+        self.key = key
+        self.domain = domain
+        self.rounds = rounds
+        self.half = math.isqrt(domain - 1) + 1
+        self.width = len(str(domain - 1))
+        # Raund qiymati faqat (i, 0..half-1) ga bog'liq - rounds * half ta natija
+        # birinchi hisoblanganda saqlanadi, keyin HMAC siz (10^7 da ~12.6k son)
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self._rounds = [[None] * self.half for _ in range(rounds)]
+
+    def _round(self, i: int, value: int) -> int:
+        table = self._rounds[i]
+        result = table[value]
+        if result is None:
+            mac = self._mac.copy()
+            mac.update(f"{i}:{value}".encode())
+            result = table[value] = int.from_bytes(mac.digest()[:8], "big") % self.half
+        return result
+
+    def _forward(self, x: int) -> int:
+        left, right = divmod(x, self.half)
+        for i in range(self.rounds):
+            left, right = right, (left + self._round(i, right)) % self.half
+        return left * self.half + right
+
+    def _backward(self, y: int) -> int:
+        left, right = divmod(y, self.half)
+        for i in reversed(range(self.rounds)):
+            left, right = (right - self._round(i, left)) % self.half, left
+        return left * self.half + right
+
+    def encode(self, seq: int) -> int:
+        # half^2 >= domain: oraliqdan chiqsa qayta aylantiriladi (cycle walking)
+        value = self._forward(seq)
+        while value >= self.domain:
+            value = self._forward(value)
+        return value
+
+    def decode(self, code: int) -> int:
+        value = self._backward(code)
+        while value >= self.domain:
+            value = self._backward(value)
+        return value
+
+    def format(self, seq: int) -> str:
+        return f"{self.encode(seq):0{self.width}d}"
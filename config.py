@@ -6,9 +6,70 @@ TOKEN = os.environ.get("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_ID = int(os.environ.get("ADMIN_ID", "6935090105"))
 DATA_FILE = "games.json"
 DB_FILE = "bot_database.db"
+# SQLite ulanish sozlamalari: synchronous (NORMAL/FULL) va xotiraga akslantirish hajmi, bayt
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Balans amallari guruhlab commit qilinadi: shuncha soniya yoki shuncha amal yig'ilganda
+LEDGER_COMMIT_DELAY = float(os.environ.get("LEDGER_COMMIT_DELAY", "0.005"))
+LEDGER_BATCH_SIZE = int(os.environ.get("LEDGER_BATCH_SIZE", "256"))
+
+# Ishga tushirish rejimi: "polling" yoki "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")  # masalan https://bot.up.railway.app
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+# HTTP server (health check "/" va webhook); Railway PORT ni o'zi beradi
+PORT = int(os.environ.get("PORT", "8080"))
+HTTP_SERVER_ENABLED = BOT_MODE == "webhook" or "PORT" in os.environ
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", "64"))
+# Foydalanuvchi bo'yicha cheklov (update/soniya, portlash) va ortiqcha yuklamada rad etish:
+# CONCURRENT_UPDATES ta ishlayotgan va MAX_WAITING_UPDATES ta kutayotgan bo'lsa yangilari rad etiladi
+RATE_LIMIT_RATE = float(os.environ.get("RATE_LIMIT_RATE", "1"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "5"))
+MAX_WAITING_UPDATES = int(os.environ.get("MAX_WAITING_UPDATES", "256"))
+# Suhbat holatlari, user_data va bot_data bazaga shuncha soniyada bir yoziladi
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "10"))
+# Multi-process rejim: WORKERS > 0 bo'lsa asosiy jarayon faqat update qabul qiladi (ingress),
+# ularni user_id bo'yicha shu sondagi worker jarayonlariga SQLite navbat orqali tarqatadi
+WORKERS = int(os.environ.get("WORKERS", "0"))
+UPDATE_QUEUE_FILE = os.environ.get("UPDATE_QUEUE_FILE", "")  # bo'sh bo'lsa baza yonida update_queue.db
+# O'yinlar katalogi versiyasi shuncha soniyada bir tekshiriladi (boshqa jarayon o'zgartirsa)
+CATALOG_POLL_INTERVAL = float(os.environ.get("CATALOG_POLL_INTERVAL", "2"))
 
 REFERRAL_BONUS = 2500
 START_BONUS = 15000
+START_BONUS_DELAY = 90  # soniya
 MIN_WITHDRAW = 25000
 BOT_USERNAME = os.environ.get("BOT_USERNAME", "Winwin_premium_bonusbot")
 WITHDRAW_SITE_URL = os.environ.get("WITHDRAW_SITE_URL", "https://futbolinsidepulyechish.netlify.app/")
+# Pul chiqarish kodlari permutatsiyasi kaliti (bo'lmasa bazada bir marta yaratiladi)
+WITHDRAW_CODE_KEY = os.environ.get("WITHDRAW_CODE_KEY", "")
+
+# Ko'rishlar hisoblagichi: necha soniyada yoki nechta ko'rishda saqlash
+VIEWS_FLUSH_INTERVAL = float(os.environ.get("VIEWS_FLUSH_INTERVAL", "5"))
+VIEWS_FLUSH_MAX_DIRTY = int(os.environ.get("VIEWS_FLUSH_MAX_DIRTY", "500"))
+
+# Broadcast: o'z tezligi + umumiy OUTBOX_RATE bucketidan token; umumiy bucketda
+# BROADCAST_RESERVE tadan kam token qolsa kutadi (javoblar uchun zaxira)
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "28"))
+BROADCAST_RESERVE = float(os.environ.get("BROADCAST_RESERVE", "5"))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "25"))
+BROADCAST_PROGRESS_INTERVAL = float(os.environ.get("BROADCAST_PROGRESS_INTERVAL", "5"))
+
+# Javoblar va bildirishnomalar navbati: chat bo'yicha cheklov va umumiy limit
+# (Telegram ~30 xabar/soniya) - broadcast ham shu umumiy limitga kiradi.
+# WORKERS > 0 da har worker OUTBOX_RATE / WORKERS va OUTBOX_BURST / WORKERS (kamida 1) oladi
+OUTBOX_RATE = float(os.environ.get("OUTBOX_RATE", "30"))
+OUTBOX_BURST = float(os.environ.get("OUTBOX_BURST", "30"))
+OUTBOX_CHAT_RATE = float(os.environ.get("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = float(os.environ.get("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", "32"))
+
+# Balans tarixi: shuncha kundan eski oylar arxiv fayliga ko'chiriladi, bazada oylik yig'indi qoladi
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", "90"))
+HISTORY_COMPACT_INTERVAL = float(os.environ.get("HISTORY_COMPACT_INTERVAL", "21600"))
+HISTORY_ARCHIVE_FILE = os.environ.get("HISTORY_ARCHIVE_FILE", "")  # bo'sh bo'lsa baza yonida
+
+# Foydalanuvchi profillari keshi
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "50000"))
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", "300"))
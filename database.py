@@ -1,9 +1,19 @@
 import sqlite3
 import json
-import random
+import itertools
 import os
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from config import DB_FILE
+from config import DB_FILE, DATA_FILE, DB_MMAP_SIZE, DB_SYNCHRONOUS, HISTORY_ARCHIVE_FILE, LEDGER_BATCH_SIZE, LEDGER_COMMIT_DELAY, PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, WITHDRAW_CODE_KEY
+from cache import TTLCache
+from codes import CodePermutation
+from hll import HyperLogLog
+from jsonstream import iter_object_items
+import metrics
 
 def get_db_path():
     """Database fayl yo'lini qaytarish (Railway volume)"""
@@ -15,10 +25,138 @@ def get_db_path():
         return db_path
     return DB_FILE
 
+# ------------------- ISHCHI OQIM (DB WORKER) -------------------
+class DatabaseWorker:
+    """Bitta doimiy ulanishga ega, so'rovlarni navbat orqali bajaruvchi oqim"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        # WAL da NORMAL: commit da fsync yo'q, baza buzilmaydi (quvvat uzilsa oxirgi commitlar yo'qolishi mumkin)
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        # INSERT OR REPLACE o'chirgan qatorlar uchun ham DELETE triggerlari ishlashi kerak (stats)
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fn, args, kwargs, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            query = fn.__name__.lstrip("_")
+            started = time.perf_counter()
+            try:
+                result = fn(conn, *args, **kwargs)
+            except BaseException as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                metrics.db_query_errors.inc(query)
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                metrics.db_query_seconds.observe(query, value=time.perf_counter() - started)
+        conn.close()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """fn(conn, *args) ni navbatga qo'yish"""
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def open_database(db_path: str = None) -> DatabaseWorker:
+    """Ishchi oqimni ishga tushirish (bir marta)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DatabaseWorker(db_path or get_db_path())
+        return _worker
+
+def close_database():
+    """Ishchi oqimni to'xtatish va ulanishni yopish"""
+    global _worker, _code_permutation
+    with _worker_lock:
+        if _worker is not None:
+            _worker.close()
+            _worker = None
+        _code_permutation = None
+
+def run_sync(fn, *args, **kwargs):
+    """Sinxron kod uchun: ishchi oqimda bajarib natijani kutish"""
+    return open_database().submit(fn, *args, **kwargs).result()
+
+async def run(fn, *args, **kwargs):
+    """Event loop ni bloklamasdan ishchi oqimda bajarish"""
+    return await asyncio.wrap_future(open_database().submit(fn, *args, **kwargs))
+
+async def ping():
+    """Health check: worker va ulanish ishlayotganini tekshirish"""
+    await run(_ping)
+
+def _ping(conn: sqlite3.Connection):
+    conn.execute("SELECT 1").fetchone()
+
+# ------------------- SXEMA -------------------
 def init_database():
-    """Ma'lumotlar bazasini yaratish"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+    """Ma'lumotlar bazasini yaratish va sxemani oxirgi versiyaga keltirish"""
+    run_sync(_init_database)
+    print(f"✅ Database created at: {open_database().db_path}")
+
+def _init_database(conn: sqlite3.Connection):
+    # Sxema joriy bo'lsa DDL umuman bajarilmaydi
+    if _schema_version(conn) < SCHEMA_VERSION:
+        _migrate_schema(conn)
+    _prune_referral_leaderboard(conn)
+    _prune_broadcast_audiences(conn)
+    # Kod kalitini oldindan yaratish - worker jarayonlari bir vaqtda yaratishga urinmasin
+    _get_code_permutation(conn.cursor())
+    conn.commit()
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _migrate_schema(conn: sqlite3.Connection):
+    """Qo'llanmagan migratsiyalarni tartib bilan, har birini alohida tranzaksiyada bajarish"""
+    while True:
+        # IMMEDIATE - bir vaqtda ishga tushgan boshqa jarayon bilan ikki marta bajarilmaydi
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = _schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+            migration = MIGRATIONS[version]
+            started = time.perf_counter()
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print(f"🛠 Migration {version + 1} ({migration.__name__}): {time.perf_counter() - started:.2f} s")
+
+# ------------------- MIGRATSIYALAR -------------------
+def _migration_1_base(conn: sqlite3.Connection):
+    """Versiyalashdan oldingi sxema (IF NOT EXISTS - eski bazalarga ham mos)"""
     cursor = conn.cursor()
     
     # Foydalanuvchilar jadvali
@@ -47,6 +185,24 @@ def init_database():
             FOREIGN KEY (referred_id) REFERENCES users(user_id)
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_referrals_created ON referrals(created_at)")
+    
+    # Top referrerlar: kunlik, haftalik va umumiy hisoblagichlar (triggerlar yangilaydi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS referral_leaderboard (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            referrer_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket, referrer_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON referral_leaderboard(period, bucket, count DESC)"
+    )
+    for sql in LEADERBOARD_TRIGGERS:
+        cursor.execute(sql)
     
     # Balans o'zgarishlari tarixi
     cursor.execute('''
@@ -61,191 +217,1352 @@ def init_database():
             FOREIGN KEY (user_id) REFERENCES users(user_id)
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_balance_history_user ON balance_history(user_id, created_at)")
+    # Arxivga ko'chirilgan eski yozuvlarning oylik yig'indisi
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS balance_history_monthly (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            amount INTEGER NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    ''')
     
-    conn.commit()
-    conn.close()
-    print(f"✅ Database created at: {db_path}")
+    # Kun stavkalari (o'yinlar) katalogi
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            text TEXT,
+            photo_id TEXT,
+            file_id TEXT,
+            button_text TEXT,
+            button_url TEXT,
+            views INTEGER DEFAULT 0,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_games_sort ON games(sort_order, id)")
+    
+    # Xizmat qiymatlari (katalog versiyasi va h.k.)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    ''')
+    
+    # Botni bloklagan / o'chirilgan foydalanuvchilar broadcastdan chiqariladi
+    _ensure_column(cursor, "users", "is_active", "INTEGER DEFAULT 1")
+    
+    # Broadcastlar va har bir yuborish natijasi
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            total INTEGER DEFAULT 0,
+            ok INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deliveries (
+            broadcast_id INTEGER,
+            user_id INTEGER,
+            status TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (broadcast_id, user_id),
+            FOREIGN KEY (broadcast_id) REFERENCES broadcasts(id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Kechiktirilgan start bonuslari (restartdan keyin ham saqlanadi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_bonuses (
+            user_id INTEGER PRIMARY KEY,
+            due_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_bonuses_due ON scheduled_bonuses(due_at)")
+    
+    # Admin statistikasi: triggerlar bilan yangilanib boradigan hisoblagichlar
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER DEFAULT 0
+        )
+    ''')
+    for sql in STATS_TRIGGERS:
+        cursor.execute(sql)
+    
+    # Application persistence: kalit bo'yicha qatorlar (faqat o'zgargani yoziladi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persist_user_data (
+            user_id INTEGER NOT NULL,
+            key BLOB NOT NULL,
+            value BLOB NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persist_bot_data (
+            key BLOB PRIMARY KEY,
+            value BLOB NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persist_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state BLOB NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("SELECT COUNT(*) FROM stats")
+    if cursor.fetchone()[0] == 0:
+        _reconcile_stats(conn)
+    
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM referral_leaderboard)")
+    if not cursor.fetchone()[0]:
+        _rebuild_referral_leaderboard(conn)
+
+def _migration_2_filter_indexes(conn: sqlite3.Connection):
+    """Statistika va bonus so'rovlari filtrlaydigan users ustunlari indekslari"""
+    # balance_history.user_id uchun idx_balance_history_user (user_id, created_at) yetarli
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_referred_by ON users(referred_by)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_start_bonus ON users(start_bonus_given)")
+
+def _migration_3_game_view_events(conn: sqlite3.Connection):
+    """O'yin ko'rishlari hodisalari va soatlik/kunlik yig'indilar (noyob ko'ruvchilar sketchi bilan)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS game_views (
+            id INTEGER PRIMARY KEY,
+            game TEXT NOT NULL,
+            user_id INTEGER,
+            viewed_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS game_view_rollups (
+            period TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            game TEXT NOT NULL,
+            views INTEGER NOT NULL DEFAULT 0,
+            sketch BLOB,
+            PRIMARY KEY (period, bucket, game)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_4_audience_indexes(conn: sqlite3.Connection):
+    """Broadcast segmentlari uchun user_id (yoki saralash ustuni) tartibidagi indekslar"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_segment_referred ON users(user_id) WHERE referred_by IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_segment_bonus ON users(user_id) WHERE start_bonus_given = 1")
+    # count_audience va top_referrers tanlovi uchun
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_referrals ON users(referrals)")
+
+def _migration_5_broadcast_audience(conn: sqlite3.Connection):
+    """Broadcast boshida qotirilgan auditoriya (user_id tartibida o'qiladi)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_audience (
+            broadcast_id INTEGER,
+            user_id INTEGER,
+            PRIMARY KEY (broadcast_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+# Tartib raqami = user_version; yangi migratsiya faqat oxiriga qo'shiladi, eskilari o'zgartirilmaydi
+MIGRATIONS = (
+    _migration_1_base,
+    _migration_2_filter_indexes,
+    _migration_3_game_view_events,
+    _migration_4_audience_indexes,
+    _migration_5_broadcast_audience,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# Har bir trigger stats qatorlarini bitta UPDATE bilan o'zgartiradi
+_USERS_STATS_DELTA = '''
+    UPDATE stats SET value = value + CASE key
+        WHEN 'total_users' THEN {sign} 1
+        WHEN 'active_users' THEN {sign} ({row}.start_bonus_given = 1)
+        WHEN 'referred_users' THEN {sign} ({row}.referred_by IS NOT NULL)
+        WHEN 'total_balance' THEN {sign} COALESCE({row}.balance, 0)
+    END
+    WHERE key IN ('total_users', 'active_users', 'referred_users', 'total_balance');
+'''
+
+STATS_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats_insert AFTER INSERT ON users BEGIN
+        {_USERS_STATS_DELTA.format(sign="+", row="NEW")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats_delete AFTER DELETE ON users BEGIN
+        {_USERS_STATS_DELTA.format(sign="-", row="OLD")}
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats_update
+    AFTER UPDATE OF balance, start_bonus_given, referred_by ON users BEGIN
+        UPDATE stats SET value = value + CASE key
+            WHEN 'active_users' THEN (NEW.start_bonus_given = 1) - (OLD.start_bonus_given = 1)
+            WHEN 'referred_users' THEN (NEW.referred_by IS NOT NULL) - (OLD.referred_by IS NOT NULL)
+            WHEN 'total_balance' THEN COALESCE(NEW.balance, 0) - COALESCE(OLD.balance, 0)
+        END
+        WHERE key IN ('active_users', 'referred_users', 'total_balance');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_games_stats_insert AFTER INSERT ON games BEGIN
+        UPDATE stats SET value = value + COALESCE(NEW.views, 0) WHERE key = 'total_views';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_games_stats_delete AFTER DELETE ON games BEGIN
+        UPDATE stats SET value = value - COALESCE(OLD.views, 0) WHERE key = 'total_views';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_games_stats_update AFTER UPDATE OF views ON games BEGIN
+        UPDATE stats SET value = value + COALESCE(NEW.views, 0) - COALESCE(OLD.views, 0)
+        WHERE key = 'total_views';
+    END
+    ''',
+)
+
+# Har bir yangi referral uchta davr hisoblagichini oshiradi (UTC bo'yicha kun va hafta)
+_LEADERBOARD_DELTA = '''
+    INSERT INTO referral_leaderboard (period, bucket, referrer_id, count)
+    VALUES ('day', date({row}.created_at), {row}.referrer_id, {sign}1),
+           ('week', strftime('%Y-W%W', {row}.created_at), {row}.referrer_id, {sign}1),
+           ('all', '', {row}.referrer_id, {sign}1)
+    ON CONFLICT(period, bucket, referrer_id) DO UPDATE SET count = count + excluded.count;
+'''
+
+LEADERBOARD_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_referrals_leaderboard_insert AFTER INSERT ON referrals BEGIN
+        {_LEADERBOARD_DELTA.format(sign="+", row="NEW")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_referrals_leaderboard_delete AFTER DELETE ON referrals BEGIN
+        {_LEADERBOARD_DELTA.format(sign="-", row="OLD")}
+    END
+    ''',
+)
+
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    """Eski bazalarga yangi ustun qo'shish"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _get_meta(conn: sqlite3.Connection, key: str, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def _set_meta(conn: sqlite3.Connection, key: str, value):
+    conn.execute('''
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, value))
+
+# ------------------- PUL CHIQARISH KODLARI -------------------
+_code_permutation = None
+
+def _get_code_permutation(cursor) -> CodePermutation:
+    global _code_permutation
+    if _code_permutation is None:
+        key = WITHDRAW_CODE_KEY
+        if not key:
+            cursor.execute("SELECT value FROM meta WHERE key = 'withdraw_code_key'")
+            row = cursor.fetchone()
+            key = row[0] if row else None
+        if not key:
+            key = os.urandom(16).hex()
+            cursor.execute(
+                "INSERT INTO meta (key, value) VALUES ('withdraw_code_key', ?)", (key,)
+            )
+        _code_permutation = CodePermutation(key.encode())
+    return _code_permutation
 
 def generate_unique_code(cursor) -> str:
-    """Database uchun unique kod yaratish"""
-    while True:
-        code = f"{random.randint(0, 9999999):07d}"
-        cursor.execute("SELECT user_id FROM users WHERE withdraw_code = ?", (code,))
-        if not cursor.fetchone():
-            return code
+    """Database uchun unique kod yaratish (bazadan qidirmasdan, O(1))
+    
+    Saqlangan tartib raqami kalitli permutatsiyadan o'tkaziladi, shuning uchun
+    kodlar takrorlanmaydi va ketma-ket emas. Tranzaksiya ichida chaqiriladi.
+    """
+    permutation = _get_code_permutation(cursor)
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES ('withdraw_code_seq', 0)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        RETURNING value
+    ''')
+    return permutation.format(cursor.fetchone()[0])
+
+def _is_code_conflict(error: sqlite3.IntegrityError) -> bool:
+    # Eski (tasodifiy) kod bilan to'qnashuv - keyingi tartib raqami olinadi
+    return "withdraw_code" in str(error)
+
+async def verify_withdraw_codes() -> dict:
+    """Kodlar takrorlanmasligini va eski kodlar bilan to'qnashuvlarni tekshirish"""
+    return await run(_verify_withdraw_codes)
+
+def _verify_withdraw_codes(conn: sqlite3.Connection) -> dict:
+    cursor = conn.cursor()
+    permutation = _get_code_permutation(cursor)
+    seq = _get_meta(conn, "withdraw_code_seq", -1)
+    
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT withdraw_code FROM users WHERE withdraw_code IS NOT NULL
+            GROUP BY withdraw_code HAVING COUNT(*) > 1
+        )
+    ''')
+    duplicates = cursor.fetchone()[0]
+    
+    total = invalid = ahead = 0
+    cursor.execute("SELECT withdraw_code FROM users WHERE withdraw_code IS NOT NULL")
+    for (code,) in cursor:
+        total += 1
+        if not (isinstance(code, str) and code.isdigit() and len(code) == permutation.width):
+            invalid += 1
+        elif permutation.decode(int(code)) > seq:
+            # Ketma-ketlik hali yetib kelmagan eski kod: keyinchalik bitta qayta urinish
+            ahead += 1
+    conn.commit()
+    return {
+        "total": total,
+        "sequence": seq + 1,
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "future_clashes": ahead,
+    }
+
+# Foydalanuvchi profillari keshi. Yozuvchi funksiyalar await dan keyin
+# yozuvni yangilaydi yoki o'chiradi; worker FIFO bo'lgani uchun eski o'qish
+# natijasi keyingi yozuvdan keyin keshga tushib qolmaydi.
+profile_cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
 
 async def get_user(user_id: int, username: str = None) -> dict:
     """Foydalanuvchini databasega qo'shish yoki olish"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    user = profile_cache.get(user_id)
+    if user is not None and user["is_active"]:
+        return dict(user)
+    user = await run(_get_user, user_id, username)
+    profile_cache.put(user_id, user)
+    return dict(user)
+
+def _get_user(conn: sqlite3.Connection, user_id: int, username: str = None) -> dict:
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
     
     cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
     user = cursor.fetchone()
     
     if not user:
-        withdraw_code = generate_unique_code(cursor)
-        
-        cursor.execute('''
-            INSERT INTO users (user_id, username, balance, withdraw_code)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, username, 0, withdraw_code))
+        while True:
+            withdraw_code = generate_unique_code(cursor)
+            try:
+                cursor.execute('''
+                    INSERT INTO users (user_id, username, balance, withdraw_code)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, username, 0, withdraw_code))
+                break
+            except sqlite3.IntegrityError as e:
+                if not _is_code_conflict(e):
+                    raise
         conn.commit()
         
         cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
         user = cursor.fetchone()
+    elif not user["is_active"]:
+        # Foydalanuvchi qaytib keldi - broadcast auditoriyasiga qaytarish
+        cursor.execute("UPDATE users SET is_active = 1 WHERE user_id = ?", (user_id,))
+        conn.commit()
+        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        user = cursor.fetchone()
     
-    conn.close()
     return dict(user)
 
-def update_balance(user_id: int, amount: int, reason: str = ""):
-    """Balansni yangilash va tarixga yozish"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# ------------------- LEDGER YOZUVCHISI (GROUP COMMIT) -------------------
+class LedgerWriter:
+    """Balans amallarini yig'ib, bitta tranzaksiyada commit qiluvchi navbat.
     
+    Amal `fn(cursor, *args)` - commit siz tranzaksiya qismi. Navbat
+    `max_delay` soniyada yoki `max_batch` ta amal yig'ilganda worker ga
+    bitta vazifa bo'lib ketadi: har amal o'z SAVEPOINT ida, oxirida bitta
+    commit (bitta fsync). Chaqiruvchi natijani commit dan keyin oladi.
+    Amal None qaytarsa yoki xato bersa faqat uning o'zgarishlari bekor qilinadi.
+    """
+
+    def __init__(self, max_delay: float = 0.005, max_batch: int = 256):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._batch = []
+        self._timer = None
+        self._tasks = set()
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((fn, args, future))
+        if len(self._batch) >= self.max_batch or self.max_delay <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.ensure_future(self._commit(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, batch: list):
+        try:
+            results = await run(_apply_ledger_batch, [(fn, args) for fn, args, _ in batch])
+        except Exception as e:
+            results = [(None, e)] * len(batch)
+        for (_, _, future), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+def _apply_ledger_batch(conn: sqlite3.Connection, ops: list) -> list:
+    """[(natija, xato)] - commit muvaffaqiyatli bo'lgandan keyin qaytadi"""
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        # BEGIN siz tashqi SAVEPOINT ning RELEASE i o'zi commit qilib yuboradi
+        cursor.execute("BEGIN")
+    results = []
+    for fn, args in ops:
+        # Worker butun partiyani apply_ledger_batch deb o'lchaydi - har amal o'z nomi bilan alohida
+        query = fn.__name__.lstrip("_")
+        started = time.perf_counter()
+        cursor.execute("SAVEPOINT ledger_op")
+        try:
+            result = fn(cursor, *args)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO ledger_op")
+            metrics.db_query_errors.inc(query)
+            results.append((None, e))
+        else:
+            if result is None:
+                cursor.execute("ROLLBACK TO ledger_op")
+            results.append((result, None))
+        cursor.execute("RELEASE ledger_op")
+        metrics.db_query_seconds.observe(query, value=time.perf_counter() - started)
+    conn.commit()
+    return results
+
+ledger = LedgerWriter(LEDGER_COMMIT_DELAY, LEDGER_BATCH_SIZE)
+
+async def update_balance(user_id: int, amount: int, reason: str = ""):
+    """Balansni yangilash va tarixga yozish"""
     try:
-        cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        if not result:
-            conn.close()
-            return False
-            
-        old_balance = result[0]
-        new_balance = old_balance + amount
-        
-        cursor.execute('''
-            UPDATE users SET balance = ? WHERE user_id = ?
-        ''', (new_balance, user_id))
-        
-        cursor.execute('''
-            INSERT INTO balance_history (user_id, old_balance, new_balance, amount, reason)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, old_balance, new_balance, amount, reason))
-        
-        conn.commit()
-        return True
+        new_balance = await ledger.submit(_credit, user_id, amount, reason)
     except Exception as e:
-        conn.rollback()
         print(f"❌ Balance update error: {e}")
         return False
-    finally:
-        conn.close()
+    profile_cache.invalidate(user_id)
+    return new_balance is not None
 
-def get_user_balance(user_id: int) -> int:
+def _credit(cursor, user_id: int, amount: int, reason: str, condition: str = "", extra: str = ""):
+    """Tranzaksiya ichida: balance = balance + amount va tarix yozuvi.
+    
+    Yangi balansni qaytaradi; foydalanuvchi topilmasa yoki `condition`
+    bajarilmasa None. commit chaqiruvchining ishi.
+    """
+    cursor.execute(f'''
+        UPDATE users SET balance = balance + ?{extra}
+        WHERE user_id = ?{condition}
+        RETURNING balance
+    ''', (amount, user_id))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    new_balance = result[0]
+    cursor.execute('''
+        INSERT INTO balance_history (user_id, old_balance, new_balance, amount, reason)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, new_balance - amount, new_balance, amount, reason))
+    return new_balance
+
+# ------------------- LEDGER AMALLARI (bitta tranzaksiya) -------------------
+async def credit_referral(referrer_id: int, referred_id: int, amount: int):
+    """Referralni yozish, taklif qiluvchiga bonus berish; yangi balans yoki None"""
+    new_balance = await ledger.submit(_credit_referral_tx, referrer_id, referred_id, amount)
+    if new_balance is not None:
+        profile_cache.invalidate(referrer_id)
+        profile_cache.invalidate(referred_id)
+    return new_balance
+
+def _credit_referral_tx(cursor, referrer_id: int, referred_id: int, amount: int):
+    try:
+        cursor.execute('''
+            INSERT INTO referrals (referrer_id, referred_id, bonus_given)
+            VALUES (?, ?, 1)
+        ''', (referrer_id, referred_id))
+    except sqlite3.IntegrityError:
+        return None
+    new_balance = _credit(
+        cursor, referrer_id, amount, "Referral bonus", extra=", referrals = referrals + 1"
+    )
+    if new_balance is None:
+        return None
+    cursor.execute(
+        "UPDATE users SET referred_by = ? WHERE user_id = ? AND referred_by IS NULL",
+        (referrer_id, referred_id),
+    )
+    return new_balance
+
+def _grant_start_bonus_tx(cursor, user_id: int, amount: int):
+    """Start bonusini faqat bir marta berish (pay_due_bonuses ichida); yangi balans yoki None"""
+    return _credit(
+        cursor, user_id, amount, "Start bonus",
+        condition=" AND start_bonus_given = 0", extra=", start_bonus_given = 1",
+    )
+
+async def get_user_balance(user_id: int) -> int:
     """Foydalanuvchi balansini olish"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+    return await run(_get_user_balance, user_id)
+
+def _get_user_balance(conn: sqlite3.Connection, user_id: int) -> int:
     cursor = conn.cursor()
     cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
     result = cursor.fetchone()
-    conn.close()
     return result[0] if result else 0
 
-def get_all_users_count() -> dict:
+async def get_all_users_count() -> dict:
     """Foydalanuvchilar statistikasi"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+    return await run(_get_all_users_count)
+
+def _get_all_users_count(conn: sqlite3.Connection) -> dict:
     cursor = conn.cursor()
+    cursor.execute("SELECT key, value FROM stats")
+    stats = dict(cursor.fetchall())
     
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE start_bonus_given = 1")
-    active = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE referred_by IS NOT NULL")
-    referred = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT SUM(balance) FROM users")
-    total_balance = cursor.fetchone()[0] or 0
-    
-    conn.close()
+    return {
+        "total": stats.get("total_users", 0),
+        "active": stats.get("active_users", 0),
+        "referred": stats.get("referred_users", 0),
+        "total_balance": stats.get("total_balance", 0),
+        "total_views": stats.get("total_views", 0)
+    }
+
+async def reconcile_stats() -> dict:
+    """stats hisoblagichlarini jadvallardan qaytadan hisoblash"""
+    return await run(_reconcile_stats_commit)
+
+def _reconcile_stats_commit(conn: sqlite3.Connection) -> dict:
+    before = _get_all_users_count(conn)
+    _reconcile_stats(conn)
+    conn.commit()
+    return {"before": before, "after": _get_all_users_count(conn)}
+
+def _reconcile_stats(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*),
+               COALESCE(SUM(start_bonus_given = 1), 0),
+               COALESCE(SUM(referred_by IS NOT NULL), 0),
+               COALESCE(SUM(balance), 0)
+        FROM users
+    ''')
+    total, active, referred, total_balance = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(SUM(views), 0) FROM games")
+    total_views = cursor.fetchone()[0]
+    cursor.executemany('''
+        INSERT INTO stats (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', [
+        ("total_users", total),
+        ("active_users", active),
+        ("referred_users", referred),
+        ("total_balance", total_balance),
+        ("total_views", total_views),
+    ])
+
+# ------------------- BROADCAST AUDITORIYASI -------------------
+AUDIENCE_SEGMENTS = ("all", "referred", "bonus", "balance", "joined", "top_referrers")
+AUDIENCE_BATCH_SIZE = 1000
+AUDIENCE_SNAPSHOT_BATCH_SIZE = 5000
+# Tugamagan (jarayon o'lgan) broadcast larning auditoriyasi shuncha kundan keyin o'chiriladi
+AUDIENCE_KEEP_DAYS = 7
+
+def _audience_filter(segment: str, params: dict) -> tuple:
+    """(is_active = 1 dan tashqari shart, parametrlar)"""
+    if segment in ("all", "top_referrers"):
+        return "", ()
+    if segment == "referred":
+        return "referred_by IS NOT NULL", ()
+    if segment == "bonus":
+        return "start_bonus_given = 1", ()
+    if segment == "balance":
+        return "balance >= ?", (params["min_balance"],)
+    if segment == "joined":
+        return "created_at >= ? AND created_at < ?", (params["since"], params["until"])
+    raise ValueError(f"Unknown audience segment: {segment}")
+
+def _audience_where(segment: str, params: dict) -> tuple:
+    condition, args = _audience_filter(segment, params)
+    if segment == "top_referrers":
+        condition = "referrals > 0"
+    return " AND ".join(filter(None, ("is_active = 1", condition))), args
+
+async def count_audience(segment: str, **params) -> int:
+    """Segmentdagi faol foydalanuvchilar soni (top_referrers uchun `limit` bilan cheklangan)"""
+    return await run(_count_audience, segment, params)
+
+def _count_audience(conn: sqlite3.Connection, segment: str, params: dict) -> int:
+    where, args = _audience_where(segment, params)
+    count = conn.execute(f"SELECT COUNT(*) FROM users WHERE {where}", args).fetchone()[0]
+    return min(count, params["limit"]) if params.get("limit") else count
+
+async def snapshot_audience(broadcast_id: int, segment: str, batch_size: int = AUDIENCE_SNAPSHOT_BATCH_SIZE, **params) -> int:
+    """Segmentni broadcast_audience ga qotirish va broadcasts.total ni yangilash.
     
+    Broadcast soatlab davom etishi mumkin - shu vaqtda balansi yoki
+    referallari o'zgargan foydalanuvchi ikki marta olinmaydi va tushib
+    qolmaydi. Segment user_id bo'yicha (o'zgarmas ustun) qisqa partiyalarda
+    o'qiladi, worker uzoq band qilinmaydi.
+    """
+    if segment == "top_referrers":
+        total = await run(_snapshot_top_referrers, broadcast_id, params["limit"])
+    else:
+        total = 0
+        after = 0
+        while after is not None:
+            added, after = await run(_snapshot_audience_batch, broadcast_id, segment, params, after, batch_size)
+            total += added
+    await run(_set_broadcast_total, broadcast_id, total)
+    return total
+
+def _snapshot_audience_batch(conn: sqlite3.Connection, broadcast_id: int, segment: str, params: dict, after: int, limit: int) -> tuple:
+    """(qo'shilganlar soni, keyingi user_id kursori yoki None)"""
+    where, args = _audience_where(segment, params)
+    rows = conn.execute(
+        f"SELECT user_id FROM users WHERE {where} AND user_id > ? ORDER BY user_id LIMIT ?",
+        (*args, after, limit)
+    ).fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO broadcast_audience (broadcast_id, user_id) VALUES (?, ?)",
+        [(broadcast_id, user_id) for (user_id,) in rows]
+    )
+    conn.commit()
+    return len(rows), (rows[-1][0] if len(rows) == limit else None)
+
+def _snapshot_top_referrers(conn: sqlite3.Connection, broadcast_id: int, limit: int) -> int:
+    # Tartib faqat tanlashda kerak - bitta so'rov, idx_users_referrals bo'yicha
+    where, args = _audience_where("top_referrers", {})
+    cursor = conn.execute(f'''
+        INSERT OR IGNORE INTO broadcast_audience (broadcast_id, user_id)
+        SELECT ?, user_id FROM users WHERE {where}
+        ORDER BY referrals DESC, user_id
+        LIMIT ?
+    ''', (broadcast_id, *args, limit))
+    conn.commit()
+    return cursor.rowcount
+
+def _set_broadcast_total(conn: sqlite3.Connection, broadcast_id: int, total: int):
+    conn.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, broadcast_id))
+    conn.commit()
+
+async def iter_audience(broadcast_id: int, batch_size: int = AUDIENCE_BATCH_SIZE):
+    """Qotirilgan auditoriya user_id larini partiyalab berish - xotirada bitta partiya turadi"""
+    after = 0
+    while True:
+        rows = await run(_get_audience_batch, broadcast_id, after, batch_size)
+        for (user_id,) in rows:
+            yield user_id
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
+
+def _get_audience_batch(conn: sqlite3.Connection, broadcast_id: int, after: int, limit: int) -> list:
+    # Har partiya alohida qisqa so'rov - uzoq ochiq o'qish tranzaksiyasi WAL checkpoint ni to'smaydi
+    return conn.execute('''
+        SELECT user_id FROM broadcast_audience
+        WHERE broadcast_id = ? AND user_id > ?
+        ORDER BY user_id
+        LIMIT ?
+    ''', (broadcast_id, after, limit)).fetchall()
+
+async def drop_audience(broadcast_id: int, batch_size: int = AUDIENCE_SNAPSHOT_BATCH_SIZE):
+    """Tugagan broadcast auditoriyasini partiyalab o'chirish"""
+    while await run(_drop_audience_batch, broadcast_id, batch_size) == batch_size:
+        pass
+
+def _drop_audience_batch(conn: sqlite3.Connection, broadcast_id: int, limit: int) -> int:
+    cursor = conn.execute('''
+        DELETE FROM broadcast_audience WHERE broadcast_id = ? AND user_id IN (
+            SELECT user_id FROM broadcast_audience WHERE broadcast_id = ? LIMIT ?
+        )
+    ''', (broadcast_id, broadcast_id, limit))
+    conn.commit()
+    return cursor.rowcount
+
+def _prune_broadcast_audiences(conn: sqlite3.Connection):
+    """Tugagan yoki jarayoni o'lgan eski broadcast lar qoldig'ini tozalash (start da)"""
+    conn.execute('''
+        DELETE FROM broadcast_audience WHERE broadcast_id IN (
+            SELECT id FROM broadcasts
+            WHERE finished_at IS NOT NULL OR created_at < datetime('now', ?)
+        )
+    ''', (f"-{AUDIENCE_KEEP_DAYS} days",))
+
+# ------------------- BALANS TARIXI -------------------
+async def get_balance_history(user_id: int, before_id: int = None, limit: int = 10) -> list:
+    """[(id, amount, new_balance, reason, created_at)] - yangidan eskiga, `before_id` dan keyingi sahifa"""
+    return await run(_get_balance_history, user_id, before_id, limit)
+
+def _get_balance_history(conn: sqlite3.Connection, user_id: int, before_id: int, limit: int) -> list:
+    # Keyset: OFFSET siz, idx_balance_history_user bo'yicha (created_at, id) dan pastga
+    if before_id is None:
+        cursor = conn.execute('''
+            SELECT id, amount, new_balance, reason, created_at FROM balance_history
+            WHERE user_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (user_id, limit))
+    else:
+        cursor = conn.execute('''
+            SELECT id, amount, new_balance, reason, created_at FROM balance_history
+            WHERE user_id = ? AND (created_at, id) < (SELECT created_at, id FROM balance_history WHERE id = ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (user_id, before_id, limit))
+    return cursor.fetchall()
+
+async def get_monthly_history(user_id: int, limit: int = 12) -> list:
+    """[(month, amount, entries)] - arxivlangan oylar yig'indisi"""
+    return await run(_get_monthly_history, user_id, limit)
+
+def _get_monthly_history(conn: sqlite3.Connection, user_id: int, limit: int) -> list:
+    return conn.execute(
+        "SELECT month, amount, entries FROM balance_history_monthly WHERE user_id = ? ORDER BY month DESC LIMIT ?",
+        (user_id, limit),
+    ).fetchall()
+
+def get_history_archive_path() -> str:
+    """Arxiv fayli: sozlanmagan bo'lsa asosiy baza yonida"""
+    if HISTORY_ARCHIVE_FILE:
+        return HISTORY_ARCHIVE_FILE
+    db_path = _worker.db_path if _worker is not None else get_db_path()
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "balance_history_archive.db")
+
+async def compact_balance_history(cutoff: str, batch_size: int = 5000) -> int:
+    """`cutoff` dan eski yozuvlarning bitta partiyasini arxivga ko'chirish; ko'chirilganlar soni"""
+    return await run(_compact_balance_history, cutoff, get_history_archive_path(), batch_size)
+
+def _compact_balance_history(conn: sqlite3.Connection, cutoff: str, archive_path: str, batch_size: int) -> int:
+    # id lar vaqt bo'yicha o'sadi - eng eski yozuvlar jadval boshida, indeks kerak emas
+    cursor = conn.execute("SELECT id, created_at FROM balance_history ORDER BY id LIMIT ?", (batch_size,))
+    last_id = None
+    moved = 0
+    for row_id, created_at in cursor.fetchall():
+        if created_at >= cutoff:
+            break
+        last_id = row_id
+        moved += 1
+    if last_id is None:
+        return 0
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.balance_history (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                old_balance INTEGER,
+                new_balance INTEGER,
+                amount INTEGER,
+                reason TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+        # Avval arxiv saqlanadi; keyingi qadam yiqilsa qayta ishga tushganda takror yozilmaydi (OR IGNORE)
+        conn.execute('''
+            INSERT OR IGNORE INTO archive.balance_history
+            SELECT id, user_id, old_balance, new_balance, amount, reason, created_at
+            FROM main.balance_history WHERE id <= ?
+        ''', (last_id,))
+        conn.commit()
+        conn.execute('''
+            INSERT INTO balance_history_monthly (user_id, month, amount, entries)
+            SELECT user_id, strftime('%Y-%m', created_at), SUM(amount), COUNT(*)
+            FROM main.balance_history WHERE id <= ?
+            GROUP BY 1, 2
+            ON CONFLICT(user_id, month) DO UPDATE SET
+                amount = amount + excluded.amount,
+                entries = entries + excluded.entries
+        ''', (last_id,))
+        conn.execute("DELETE FROM main.balance_history WHERE id <= ?", (last_id,))
+        conn.commit()
+    finally:
+        # Ochiq tranzaksiya bilan DETACH qilib bo'lmaydi
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("DETACH DATABASE archive")
+    return moved
+
+# ------------------- REFERRAL REYTINGI VA DARAXTI -------------------
+LEADERBOARD_PERIODS = ("day", "week", "all")
+LEADERBOARD_KEEP_DAYS = 35
+
+def _leaderboard_bucket(period: str, now: float = None) -> str:
+    # SQLite date() / strftime('%Y-W%W') bilan bir xil (UTC)
+    moment = time.gmtime(now)
+    if period == "day":
+        return time.strftime("%Y-%m-%d", moment)
+    if period == "week":
+        return time.strftime("%Y-W%W", moment)
+    return ""
+
+async def get_top_referrers(period: str = "all", limit: int = 10) -> list:
+    """[(user_id, username, soni)] - joriy kun/hafta yoki umumiy reyting"""
+    return await run(_get_top_referrers, period, limit)
+
+def _get_top_referrers(conn: sqlite3.Connection, period: str, limit: int) -> list:
+    if period not in LEADERBOARD_PERIODS:
+        raise ValueError(f"Unknown leaderboard period: {period}")
+    cursor = conn.execute('''
+        SELECT l.referrer_id, u.username, l.count
+        FROM referral_leaderboard l
+        LEFT JOIN users u ON u.user_id = l.referrer_id
+        WHERE l.period = ? AND l.bucket = ? AND l.count > 0
+        ORDER BY l.count DESC
+        LIMIT ?
+    ''', (period, _leaderboard_bucket(period), limit))
+    return cursor.fetchall()
+
+async def rebuild_referral_leaderboard():
+    """Reytingni referrals va users jadvallaridan qaytadan hisoblash"""
+    await run(_rebuild_referral_leaderboard_commit)
+
+def _rebuild_referral_leaderboard_commit(conn: sqlite3.Connection):
+    _rebuild_referral_leaderboard(conn)
+    conn.commit()
+
+def _rebuild_referral_leaderboard(conn: sqlite3.Connection):
+    since = f"-{LEADERBOARD_KEEP_DAYS} days"
+    conn.execute("DELETE FROM referral_leaderboard")
+    conn.execute('''
+        INSERT INTO referral_leaderboard (period, bucket, referrer_id, count)
+        SELECT 'day', date(created_at), referrer_id, COUNT(*)
+        FROM referrals WHERE created_at >= date('now', ?) AND referrer_id IS NOT NULL
+        GROUP BY 2, 3
+    ''', (since,))
+    conn.execute('''
+        INSERT INTO referral_leaderboard (period, bucket, referrer_id, count)
+        SELECT 'week', strftime('%Y-W%W', created_at), referrer_id, COUNT(*)
+        FROM referrals WHERE created_at >= date('now', ?) AND referrer_id IS NOT NULL
+        GROUP BY 2, 3
+    ''', (since,))
+    # Umumiy reyting users.referrals dan - JSON dan ko'chirilgan eski hisoblar ham kiradi
+    conn.execute('''
+        INSERT INTO referral_leaderboard (period, bucket, referrer_id, count)
+        SELECT 'all', '', user_id, referrals FROM users WHERE referrals > 0
+    ''')
+
+def _prune_referral_leaderboard(conn: sqlite3.Connection):
+    # Eski kun va hafta hisoblagichlari kerak emas (PK bo'yicha diapazon)
+    cutoff = time.time() - LEADERBOARD_KEEP_DAYS * 86400
+    conn.execute(
+        "DELETE FROM referral_leaderboard WHERE period = 'day' AND bucket < ?",
+        (_leaderboard_bucket("day", cutoff),),
+    )
+    conn.execute(
+        "DELETE FROM referral_leaderboard WHERE period = 'week' AND bucket < ?",
+        (_leaderboard_bucket("week", cutoff),),
+    )
+
+async def get_referral_tree(user_id: int, depth: int = 3, recent: int = 10, max_nodes: int = 100000) -> dict:
+    """Foydalanuvchining yuqori zanjiri, har daraja bo'yicha takliflar soni va oxirgi takliflari"""
+    return await run(_get_referral_tree, user_id, depth, recent, max_nodes)
+
+def _get_referral_tree(conn: sqlite3.Connection, user_id: int, depth: int, recent: int, max_nodes: int) -> dict:
+    cursor = conn.cursor()
+    # Pastga: idx_referrals_referrer bo'yicha, tugunlar soni cheklangan
+    cursor.execute('''
+        WITH RECURSIVE tree(user_id, depth) AS (
+            SELECT referred_id, 1 FROM referrals WHERE referrer_id = ?
+            UNION ALL
+            SELECT r.referred_id, t.depth + 1
+            FROM tree t JOIN referrals r ON r.referrer_id = t.user_id
+            WHERE t.depth < ?
+            LIMIT ?
+        )
+        SELECT depth, COUNT(*) FROM tree GROUP BY depth ORDER BY depth
+    ''', (user_id, depth, max_nodes))
+    levels = cursor.fetchall()
+    # Yuqoriga: users.referred_by zanjiri (PK bo'yicha)
+    cursor.execute('''
+        WITH RECURSIVE chain(user_id, referred_by, depth) AS (
+            SELECT user_id, referred_by, 0 FROM users WHERE user_id = ?
+            UNION ALL
+            SELECT u.user_id, u.referred_by, c.depth + 1
+            FROM chain c JOIN users u ON u.user_id = c.referred_by
+            WHERE c.depth < ?
+        )
+        SELECT c.referred_by, u.username FROM chain c
+        LEFT JOIN users u ON u.user_id = c.referred_by
+        WHERE c.referred_by IS NOT NULL ORDER BY c.depth
+    ''', (user_id, depth))
+    upline = cursor.fetchall()
+    cursor.execute('''
+        SELECT r.referred_id, u.username, u.referrals, r.created_at
+        FROM referrals r LEFT JOIN users u ON u.user_id = r.referred_id
+        WHERE r.referrer_id = ?
+        ORDER BY r.created_at DESC
+        LIMIT ?
+    ''', (user_id, recent))
     return {
-        "total": total,
-        "active": active,
-        "referred": referred,
-        "total_balance": total_balance
+        "levels": levels,
+        "truncated": sum(count for _, count in levels) >= max_nodes,
+        "upline": upline,
+        "recent": cursor.fetchall(),
     }
 
-def update_referral_bonus(referrer_id: int, referred_id: int) -> bool:
-    """Referral bonusini hisoblash va saqlash"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+# ------------------- START BONUSI NAVBATI -------------------
+async def schedule_start_bonus(user_id: int, due_at: float) -> bool:
+    """Start bonusini due_at (unix vaqt) ga rejalashtirish; allaqachon bo'lsa False"""
+    return await run(_schedule_start_bonus, user_id, due_at)
+
+def _schedule_start_bonus(conn: sqlite3.Connection, user_id: int, due_at: float) -> bool:
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO scheduled_bonuses (user_id, due_at) VALUES (?, ?)",
+        (user_id, due_at),
+    )
+    conn.commit()
+    return cursor.rowcount > 0
+
+async def get_next_bonus_due():
+    """Eng yaqin bonus vaqti yoki None"""
+    return await run(_get_next_bonus_due)
+
+def _get_next_bonus_due(conn: sqlite3.Connection):
+    return conn.execute("SELECT MIN(due_at) FROM scheduled_bonuses").fetchone()[0]
+
+async def get_scheduled_bonuses_count() -> int:
+    return await run(_get_scheduled_bonuses_count)
+
+def _get_scheduled_bonuses_count(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM scheduled_bonuses").fetchone()[0]
+
+async def pay_due_bonuses(now: float, amount: int, limit: int = 500) -> list:
+    """Vaqti kelgan bonuslarni bitta tranzaksiyada to'lash, [(user_id, yangi balans)]"""
+    paid = await run(_pay_due_bonuses, now, amount, limit)
+    for user_id, new_balance in paid:
+        profile_cache.update(user_id, balance=new_balance, start_bonus_given=1)
+    return paid
+
+def _pay_due_bonuses(conn: sqlite3.Connection, now: float, amount: int, limit: int) -> list:
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT user_id FROM scheduled_bonuses
+        WHERE due_at <= ? ORDER BY due_at LIMIT ?
+    ''', (now, limit))
+    due = [row[0] for row in cursor.fetchall()]
+    
+    paid = []
+    for user_id in due:
+        new_balance = _grant_start_bonus_tx(cursor, user_id, amount)
+        if new_balance is not None:
+            paid.append((user_id, new_balance))
+    
+    cursor.executemany(
+        "DELETE FROM scheduled_bonuses WHERE user_id = ?", [(user_id,) for user_id in due]
+    )
+    conn.commit()
+    return paid
+
+# ------------------- APPLICATION PERSISTENCE -------------------
+async def load_user_data(user_id: int) -> list:
+    """[(key, value)] - bitta foydalanuvchining saqlangan user_data si (pickle)"""
+    return await run(_load_user_data, user_id)
+
+def _load_user_data(conn: sqlite3.Connection, user_id: int) -> list:
+    return conn.execute("SELECT key, value FROM persist_user_data WHERE user_id = ?", (user_id,)).fetchall()
+
+async def load_bot_data() -> list:
+    return await run(_load_bot_data)
+
+def _load_bot_data(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT key, value FROM persist_bot_data").fetchall()
+
+async def load_conversations(name: str) -> list:
+    """[(key JSON, state)] - bitta ConversationHandler holatlari"""
+    return await run(_load_conversations, name)
+
+def _load_conversations(conn: sqlite3.Connection, name: str) -> list:
+    return conn.execute("SELECT key, state FROM persist_conversations WHERE name = ?", (name,)).fetchall()
+
+async def write_persistence(dropped_users: list, user_rows: list, bot_rows: list, conversation_rows: list):
+    """O'zgarishlarni bitta tranzaksiyada yozish; qiymat None bo'lsa qator o'chiriladi"""
+    await run(_write_persistence, dropped_users, user_rows, bot_rows, conversation_rows)
+
+def _write_persistence(
+    conn: sqlite3.Connection, dropped_users: list, user_rows: list, bot_rows: list, conversation_rows: list
+):
+    conn.executemany("DELETE FROM persist_user_data WHERE user_id = ?", [(user_id,) for user_id in dropped_users])
+    conn.executemany(
+        "INSERT OR REPLACE INTO persist_user_data (user_id, key, value) VALUES (?, ?, ?)",
+        [row for row in user_rows if row[2] is not None],
+    )
+    conn.executemany(
+        "DELETE FROM persist_user_data WHERE user_id = ? AND key = ?",
+        [row[:2] for row in user_rows if row[2] is None],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO persist_bot_data (key, value) VALUES (?, ?)",
+        [row for row in bot_rows if row[1] is not None],
+    )
+    conn.executemany("DELETE FROM persist_bot_data WHERE key = ?", [row[:1] for row in bot_rows if row[1] is None])
+    conn.executemany(
+        "INSERT OR REPLACE INTO persist_conversations (name, key, state) VALUES (?, ?, ?)",
+        [row for row in conversation_rows if row[2] is not None],
+    )
+    conn.executemany(
+        "DELETE FROM persist_conversations WHERE name = ? AND key = ?",
+        [row[:2] for row in conversation_rows if row[2] is None],
+    )
+    conn.commit()
+
+# ------------------- BROADCAST JURNALI -------------------
+# Bu natijalar qaytarilgan foydalanuvchilar keyingi broadcastlarga kiritilmaydi
+PERMANENT_FAILURES = ("forbidden", "chat_not_found")
+
+async def create_broadcast(admin_id: int, total: int) -> int:
+    """Yangi broadcast yozuvini yaratish, ID sini qaytaradi"""
+    return await run(_create_broadcast, admin_id, total)
+
+def _create_broadcast(conn: sqlite3.Connection, admin_id: int, total: int) -> int:
+    cursor = conn.execute(
+        "INSERT INTO broadcasts (admin_id, total) VALUES (?, ?)", (admin_id, total)
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+async def record_deliveries(broadcast_id: int, results: list):
+    """[(user_id, status, error)] ni yozish va doimiy xatolarni nofaol qilish"""
+    await run(_record_deliveries, broadcast_id, results)
+    for user_id, status, _ in results:
+        if status in PERMANENT_FAILURES:
+            profile_cache.invalidate(user_id)
+
+def _record_deliveries(conn: sqlite3.Connection, broadcast_id: int, results: list):
+    conn.executemany('''
+        INSERT OR REPLACE INTO deliveries (broadcast_id, user_id, status, error)
+        VALUES (?, ?, ?, ?)
+    ''', [(broadcast_id, user_id, status, error) for user_id, status, error in results])
+    conn.executemany(
+        "UPDATE users SET is_active = 0 WHERE user_id = ?",
+        [(user_id,) for user_id, status, _ in results if status in PERMANENT_FAILURES],
+    )
+    conn.commit()
+
+async def finish_broadcast(broadcast_id: int, ok: int, failed: int):
+    """Broadcast yakunini saqlash"""
+    await run(_finish_broadcast, broadcast_id, ok, failed)
+
+def _finish_broadcast(conn: sqlite3.Connection, broadcast_id: int, ok: int, failed: int):
+    conn.execute('''
+        UPDATE broadcasts SET ok = ?, failed = ?, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (ok, failed, broadcast_id))
+    conn.commit()
+
+MIGRATION_BATCH_SIZE = 5000
+
+USER_UPSERT = '''
+    INSERT INTO users (user_id, username, balance, referred_by, referrals, start_bonus_given, withdraw_code)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        balance = excluded.balance,
+        referred_by = excluded.referred_by,
+        referrals = excluded.referrals,
+        start_bonus_given = excluded.start_bonus_given,
+        withdraw_code = excluded.withdraw_code
+'''
+
+def migrate_from_json(json_file: str = "users.json", batch_size: int = MIGRATION_BATCH_SIZE):
+    """Eski JSON ma'lumotlarni SQLite ga ko'chirish (oqimli, to'xtagan joydan davom etadi)"""
+    run_sync(_migrate_from_json, json_file, batch_size)
+
+def _json_source_id(json_file: str) -> str:
+    # Fayl o'zgarsa checkpoint eskiradi va import boshidan boshlanadi
+    stat = os.stat(json_file)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def _user_row(cursor, user_id_str: str, user_data: dict) -> tuple:
+    return (
+        int(user_id_str),
+        user_data.get('username', ''),
+        user_data.get('balance', 0),
+        user_data.get('referred_by'),
+        user_data.get('referrals', 0),
+        1 if user_data.get('start_bonus_given', False) else 0,
+        user_data.get('withdraw_code') or generate_unique_code(cursor),
+    )
+
+def _upsert_users(cursor, rows: list):
+    try:
+        cursor.executemany(USER_UPSERT, rows)
+        return
+    except sqlite3.IntegrityError as e:
+        if not _is_code_conflict(e):
+            raise
+    # Partiyada kod to'qnashuvi bor - qatorma-qator, to'qnashganiga yangi kod
+    # (UPSERT takror bajarilsa natija o'zgarmaydi)
+    for row in rows:
+        while True:
+            try:
+                cursor.execute(USER_UPSERT, row)
+                break
+            except sqlite3.IntegrityError as e:
+                if not _is_code_conflict(e):
+                    raise
+                row = row[:-1] + (generate_unique_code(cursor),)
+
+def _migrate_from_json(conn: sqlite3.Connection, json_file: str, batch_size: int):
+    if not Path(json_file).exists():
+        return
+    source = _json_source_id(json_file)
+    done = 0
+    if _get_meta(conn, "users_json_source") == source:
+        done = _get_meta(conn, "users_json_done", 0)
+        print(f"⏩ Resuming JSON migration after {done} users")
+    resumed = done
     cursor = conn.cursor()
+    started = time.monotonic()
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            items = iter_object_items(f)
+            for _ in itertools.islice(items, done):
+                pass
+            while True:
+                batch = list(itertools.islice(items, batch_size))
+                if not batch:
+                    break
+                _upsert_users(cursor, [_user_row(cursor, *item) for item in batch])
+                done += len(batch)
+                _set_meta(conn, "users_json_source", source)
+                _set_meta(conn, "users_json_done", done)
+                conn.commit()
+                print(f"⏳ {done} users migrated ({(done - resumed) / (time.monotonic() - started):.0f}/s)")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        print(f"❌ Migration error after {done} users (will resume on next start): {e}")
+        return
     
+    print(f"✅ {done} users migrated from JSON")
+    backup_name = f"{json_file}.migrated"
+    os.replace(json_file, backup_name)
+    conn.execute("DELETE FROM meta WHERE key IN ('users_json_source', 'users_json_done')")
+    # Ko'chirilgan referrals hisoblari umumiy reytingga
+    _rebuild_referral_leaderboard(conn)
+    conn.commit()
+    print(f"📦 Old JSON file saved as {backup_name}")
+
+# ------------------- O'YINLAR KATALOGI -------------------
+GAME_FIELDS = ("text", "photo_id", "file_id", "button_text", "button_url")
+
+def _bump_catalog_version(conn: sqlite3.Connection):
+    conn.execute('''
+        INSERT INTO meta (key, value) VALUES ('catalog_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    ''')
+
+async def get_catalog_version() -> int:
+    """Katalog versiyasi (admin har o'zgartirganda oshadi)"""
+    return await run(_get_catalog_version)
+
+def _get_catalog_version(conn: sqlite3.Connection) -> int:
+    return _get_meta(conn, "catalog_version", 0)
+
+async def get_games() -> tuple:
+    """(versiya, [o'yinlar]) - tartib bo'yicha"""
+    return await run(_get_games)
+
+def _get_games(conn: sqlite3.Connection) -> tuple:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute('''
+        SELECT name, text, photo_id, file_id, button_text, button_url, views, sort_order
+        FROM games ORDER BY sort_order, id
+    ''')
+    games = [dict(row) for row in cursor.fetchall()]
+    return _get_catalog_version(conn), games
+
+async def add_game(name: str, **fields) -> bool:
+    """Yangi o'yin qo'shish (nom band bo'lsa False)"""
+    return await run(_add_game, name, fields)
+
+def _add_game(conn: sqlite3.Connection, name: str, fields: dict) -> bool:
+    values = [fields.get(field) for field in GAME_FIELDS]
     try:
-        cursor.execute('''
-            INSERT INTO referrals (referrer_id, referred_id, bonus_given)
-            VALUES (?, ?, 1)
-        ''', (referrer_id, referred_id))
-        
-        cursor.execute('''
-            UPDATE users SET referrals = referrals + 1
-            WHERE user_id = ?
-        ''', (referrer_id,))
-        
+        conn.execute(f'''
+            INSERT INTO games (name, {", ".join(GAME_FIELDS)}, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(sort_order), 0) + 1 FROM games))
+        ''', (name, *values))
+        _bump_catalog_version(conn)
         conn.commit()
         return True
     except sqlite3.IntegrityError:
-        return False
-    except Exception as e:
         conn.rollback()
-        print(f"❌ Referral error: {e}")
         return False
-    finally:
-        conn.close()
 
-def get_all_users():
-    """Barcha foydalanuvchilar ID larini olish (broadcast uchun)"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id FROM users")
-    users = cursor.fetchall()
-    conn.close()
-    return users
-
-def migrate_from_json():
-    """Eski JSON ma'lumotlarni SQLite ga ko'chirish"""
-    json_file = "users.json"
-    if Path(json_file).exists():
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                old_users = json.load(f)
-            
-            db_path = get_db_path()
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            for user_id_str, user_data in old_users.items():
-                withdraw_code = user_data.get('withdraw_code')
-                if not withdraw_code:
-                    withdraw_code = generate_unique_code(cursor)
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO users 
-                    (user_id, username, balance, referred_by, referrals, start_bonus_given, withdraw_code)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    int(user_id_str),
-                    user_data.get('username', ''),
-                    user_data.get('balance', 0),
-                    user_data.get('referred_by'),
-                    user_data.get('referrals', 0),
-                    1 if user_data.get('start_bonus_given', False) else 0,
-                    withdraw_code
-                ))
-            
-            conn.commit()
-            conn.close()
-            print(f"✅ {len(old_users)} users migrated from JSON")
-            
-            backup_name = f"users_backup_{random.randint(1000, 9999)}.json"
-            os.rename(json_file, backup_name)
-            print(f"📦 Old JSON file saved as {backup_name}")
-            
-        except Exception as e:
-            print(f"❌ Migration error: {e}")
+async def update_game(name: str, **fields) -> bool:
+    """O'yin maydonlarini yangilash"""
+    return await run(_update_game, name, fields)
+
+def _update_game(conn: sqlite3.Connection, name: str, fields: dict) -> bool:
+    columns = [field for field in fields if field in GAME_FIELDS + ("sort_order",)]
+    if not columns:
+        return False
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    cursor = conn.execute(
+        f"UPDATE games SET {assignments} WHERE name = ?",
+        (*(fields[column] for column in columns), name),
+    )
+    if cursor.rowcount:
+        _bump_catalog_version(conn)
+    conn.commit()
+    return cursor.rowcount > 0
+
+async def delete_game(name: str) -> bool:
+    """O'yinni o'chirish"""
+    return await run(_delete_game, name)
+
+def _delete_game(conn: sqlite3.Connection, name: str) -> bool:
+    cursor = conn.execute("DELETE FROM games WHERE name = ?", (name,))
+    if cursor.rowcount:
+        _bump_catalog_version(conn)
+    conn.commit()
+    return cursor.rowcount > 0
+
+# Ko'rishlar yig'indisi davrlari: (nomi, uzunligi soniyada), UTC bo'yicha
+VIEW_ROLLUP_PERIODS = (("hour", 3600), ("day", 86400))
+VIEW_SKETCH_P = 10
+
+async def add_game_views(deltas: dict, events: list = ()):
+    """Yig'ilgan ko'rishlar: games.views, hodisalar va yig'indilar - bitta tranzaksiyada"""
+    await run(_add_game_views, deltas, list(events))
+
+def _add_game_views(conn: sqlite3.Connection, deltas: dict, events: list):
+    if events and not conn.in_transaction:
+        # Sketch o'qib-yoziladi - boshqa worker jarayoni bilan to'qnashmasligi uchun darhol yozish qulfi
+        conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "UPDATE games SET views = views + ? WHERE name = ?",
+        [(count, name) for name, count in deltas.items()],
+    )
+    if events:
+        conn.executemany("INSERT INTO game_views (game, user_id, viewed_at) VALUES (?, ?, ?)", events)
+        _update_view_rollups(conn, events)
+    conn.commit()
+
+def _update_view_rollups(conn: sqlite3.Connection, events: list):
+    groups = {}
+    for game, user_id, viewed_at in events:
+        for period, size in VIEW_ROLLUP_PERIODS:
+            group = groups.setdefault((period, viewed_at - viewed_at % size, game), [0, set()])
+            group[0] += 1
+            if user_id is not None:
+                group[1].add(user_id)
+    for (period, bucket, game), (views, users) in groups.items():
+        row = conn.execute(
+            "SELECT sketch FROM game_view_rollups WHERE period = ? AND bucket = ? AND game = ?",
+            (period, bucket, game),
+        ).fetchone()
+        sketch = HyperLogLog(VIEW_SKETCH_P, row[0] if row and row[0] else None)
+        sketch.update(users)
+        conn.execute('''
+            INSERT INTO game_view_rollups (period, bucket, game, views, sketch) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(period, bucket, game) DO UPDATE SET
+                views = views + excluded.views,
+                sketch = excluded.sketch
+        ''', (period, bucket, game, views, sketch.to_bytes()))
+
+async def get_game_view_stats(now: float = None) -> dict:
+    """{o'yin: {"views", "views_24h", "uniques_24h", "views_7d", "uniques_7d"}} - katalog tartibida.
+    
+    "views" - games jadvalidagi jami, qolganlari yig'indilardan.
+    """
+    return await run(_get_game_view_stats, time.time() if now is None else now)
+
+def _get_game_view_stats(conn: sqlite3.Connection, now: float) -> dict:
+    now = int(now)
+    stats = {
+        name: {"views": views or 0, "views_24h": 0, "uniques_24h": 0, "views_7d": 0, "uniques_7d": 0}
+        for name, views in conn.execute("SELECT name, views FROM games ORDER BY sort_order, id")
+    }
+    # Oxirgi 24 soatlik va 7 kunlik bucket (joriy, to'liq bo'lmagani bilan)
+    for label, period, size, count in (("24h", "hour", 3600, 24), ("7d", "day", 86400, 7)):
+        since = now - now % size - (count - 1) * size
+        cursor = conn.execute(
+            "SELECT game, views, sketch FROM game_view_rollups WHERE period = ? AND bucket >= ?",
+            (period, since),
+        )
+        sketches = {}
+        for game, views, sketch in cursor.fetchall():
+            if game not in stats:
+                # O'chirilgan o'yin
+                continue
+            stats[game][f"views_{label}"] += views
+            if sketch:
+                merged = sketches.setdefault(game, HyperLogLog(VIEW_SKETCH_P))
+                merged.merge(HyperLogLog(VIEW_SKETCH_P, sketch))
+        for game, merged in sketches.items():
+            stats[game][f"uniques_{label}"] = merged.count()
+    return stats
+
+def import_games_from_json(json_file: str = DATA_FILE):
+    """games.json ni games jadvaliga bir martalik ko'chirish"""
+    run_sync(_import_games_from_json, json_file)
+
+def _import_games_from_json(conn: sqlite3.Connection, json_file: str):
+    if not Path(json_file).exists():
+        return
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            old_games = json.load(f)
+        
+        rows = [
+            (name, *(game.get(field) for field in GAME_FIELDS), game.get("views", 0), order)
+            for order, (name, game) in enumerate(old_games.items(), start=1)
+        ]
+        conn.executemany(f'''
+            INSERT OR IGNORE INTO games (name, {", ".join(GAME_FIELDS)}, views, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        _bump_catalog_version(conn)
+        conn.commit()
+        print(f"✅ {len(rows)} games imported from {json_file}")
+        
+        backup_name = f"{json_file}.imported"
+        os.replace(json_file, backup_name)
+        print(f"📦 Old games file saved as {backup_name}")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        print(f"❌ Games import error: {e}")
@@ -0,0 +1,78 @@
+import json
+import re
+from typing import Any, Iterator, TextIO, Tuple
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*")
+
+
+class _Reader:
+    """Fayldan bo'laklab o'qib, JSON qiymatlarini birma-bir ajratuvchi bufer"""
+
+    def __init__(self, fp: TextIO, chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON: expected {char!r}, got {found or 'EOF'!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # qiymat bufer chegarasida kesilgan - yana o'qiymiz
+                if not self._fill():
+                    raise
+                continue
+            # son bufer oxiriga yetsa, davomi keyingi bo'lakda bo'lishi mumkin
+            if (
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                and _NUMBER_TAIL.match(self.buf, end).end() == len(self.buf) and self._fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_object_items(fp: TextIO, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """Yuqori darajadagi JSON obyektning (kalit, qiymat) juftlarini butun faylni yuklamasdan qaytarish"""
+    reader = _Reader(fp, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise ValueError(f"JSON: object key must be a string, got {key!r}")
+        reader.expect(":")
+        yield key, reader.value()
+        separator = reader.peek()
+        if separator == "}":
+            return
+        reader.expect(",")
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Iterable, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rad etish sabablari (bot_updates_dropped_total{reason})
+RATE_LIMITED = "rate_limit"
+DUPLICATE = "duplicate"
+OVERLOADED = "overload"
+
+RATE_LIMIT_TEXT = "⏳ Juda tez! Biroz kuting."
+OVERLOAD_TEXT = "⏳ Bot band, birozdan keyin urinib ko‘ring."
+
+
+class UpdateLimiter(BaseUpdateProcessor):
+    """Barcha handlerlardan oldin ishlaydigan update processor.
+
+    - har foydalanuvchi uchun token bucket: sekundiga `rate` ta, `burst` tagacha;
+    - bir xil callback (foydalanuvchi + data) oldingisi tugamaguncha qayta
+      bosilsa, ikkinchisi bajarilmaydi;
+    - `concurrency` ta update ishlayotgan va `max_waiting` tasi kutayotgan
+      bo'lsa, yangilari kutmasdan rad etiladi.
+    Rad etilgan callback larga faqat query.answer yuboriladi.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        rate: float,
+        burst: float,
+        max_waiting: Optional[int] = None,
+        exempt: Iterable[int] = (),
+    ):
+        # Shedding yoqilgan bo'lsa PTB semafori kengroq - ortiqcha update lar
+        # PTB navbatida kutib qolmay, shu yerga kirib darhol rad etiladi
+        super().__init__(concurrency if max_waiting is None else concurrency * 2 + max_waiting)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_waiting = max_waiting
+        self.exempt = set(exempt)
+        self.waiting = 0
+        self._slots = None
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._in_flight: Set[Tuple[int, str]] = set()
+        self._answers = set()
+        self._next_sweep = 0.0
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self):
+        await asyncio.gather(*self._answers, return_exceptions=True)
+
+    def _allow(self, user_id: int, now: float) -> bool:
+        tokens, updated = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        self._buckets[user_id] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def _sweep(self, now: float):
+        # To'lib qolgan bucket lar yangisidan farq qilmaydi - xotirada saqlash shart emas
+        full_after = self.burst / self.rate
+        self._buckets = {
+            user_id: state for user_id, state in self._buckets.items() if now - state[1] < full_after
+        }
+        self._next_sweep = now + max(full_after, 60.0)
+
+    def _drop(self, update: Any, coroutine: Awaitable, reason: str, text: str = None):
+        metrics.updates_dropped.inc(reason)
+        close = getattr(coroutine, "close", None)
+        if close is not None:
+            close()
+        query = update.callback_query if isinstance(update, Update) else None
+        if query is not None:
+            # Javob kutilmaydi - rad etish arzon bo'lishi kerak
+            task = asyncio.create_task(query.answer(text))
+            self._answers.add(task)
+            task.add_done_callback(self._answer_done)
+
+    def _answer_done(self, task: asyncio.Task):
+        self._answers.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Drop answer error: {task.exception()}")
+
+    async def do_process_update(self, update: Any, coroutine: Awaitable):
+        user = update.effective_user if isinstance(update, Update) else None
+        user_id = user.id if user is not None else None
+        if self.rate and user_id is not None and user_id not in self.exempt:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if not self._allow(user_id, now):
+                self._drop(update, coroutine, RATE_LIMITED, RATE_LIMIT_TEXT)
+                return
+
+        key = None
+        if user_id is not None and update.callback_query is not None:
+            key = (user_id, update.callback_query.data)
+            if key in self._in_flight:
+                self._drop(update, coroutine, DUPLICATE)
+                return
+
+        if self.max_waiting is not None and self._slots.locked() and self.waiting >= self.max_waiting:
+            self._drop(update, coroutine, OVERLOADED, OVERLOAD_TEXT)
+            return
+
+        if key is not None:
+            self._in_flight.add(key)
+        try:
+            self.waiting += 1
+            metrics.updates_waiting.set(value=self.waiting)
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+                metrics.updates_waiting.set(value=self.waiting)
+            try:
+                await coroutine
+            finally:
+                self._slots.release()
+        finally:
+            if key is not None:
+                self._in_flight.discard(key)
@@ -0,0 +1,109 @@
+"""Xizmat buyruqlari.
+
+    python manage.py verify-codes
+    python manage.py reconcile-stats
+    python manage.py rebuild-leaderboard
+    python manage.py compact-history --days 90
+    python manage.py post-update samples/updates/start.json --url http://localhost:8080/webhook
+"""
+import argparse
+import asyncio
+import functools
+import urllib.error
+import urllib.request
+
+import database
+from config import HISTORY_RETENTION_DAYS, PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+from retention import HistoryCompactor
+
+
+def with_database(func):
+    @functools.wraps(func)
+    def wrapper(args):
+        database.init_database()
+        try:
+            return func(args)
+        finally:
+            database.close_database()
+    return wrapper
+
+
+@with_database
+def verify_codes(args):
+    report = asyncio.run(database.verify_withdraw_codes())
+    print(f"Kodlar: {report['total']}")
+    print(f"Berilgan tartib raqamlari: {report['sequence']}")
+    print(f"Takrorlangan: {report['duplicates']}")
+    print(f"Noto'g'ri format: {report['invalid']}")
+    print(f"Kelajakdagi to'qnashuvlar (eski kodlar): {report['future_clashes']}")
+    return 1 if report["duplicates"] else 0
+
+
+@with_database
+def reconcile_stats(args):
+    report = asyncio.run(database.reconcile_stats())
+    for key, after in report["after"].items():
+        before = report["before"][key]
+        mark = "" if before == after else f"  (edi {before})"
+        print(f"{key}: {after}{mark}")
+    return 0
+
+
+@with_database
+def rebuild_leaderboard(args):
+    asyncio.run(database.rebuild_referral_leaderboard())
+    for period in database.LEADERBOARD_PERIODS:
+        top = asyncio.run(database.get_top_referrers(period, limit=3))
+        print(f"{period}: " + ", ".join(f"{user_id}={count}" for user_id, _, count in top))
+    return 0
+
+
+@with_database
+def compact_history(args):
+    compactor = HistoryCompactor(args.days, interval=0, batch_size=args.batch_size)
+    moved = asyncio.run(compactor.compact())
+    print(f"Arxivga ko'chirildi: {moved} ({database.get_history_archive_path()})")
+    return 0
+
+
+def post_update(args):
+    """Yozib olingan Update JSON ni lokal webhook ga yuborish"""
+    headers = {"Content-Type": "application/json"}
+    if args.secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = args.secret
+    status = 0
+    for path in args.files:
+        with open(path, "rb") as f:
+            body = f.read()
+        request = urllib.request.Request(args.url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                print(f"{path}: {response.status} {response.read().decode()}")
+        except urllib.error.HTTPError as e:
+            print(f"{path}: {e.code} {e.read().decode()}")
+            status = 1
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BetWinner bot xizmat buyruqlari")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("verify-codes", help="withdraw kodlarini tekshirish").set_defaults(func=verify_codes)
+    subparsers.add_parser("reconcile-stats", help="admin statistikasini qayta hisoblash").set_defaults(func=reconcile_stats)
+    subparsers.add_parser("rebuild-leaderboard", help="referral reytingini qayta hisoblash").set_defaults(func=rebuild_leaderboard)
+    compact = subparsers.add_parser("compact-history", help="eski balans tarixini arxivga ko'chirish")
+    compact.add_argument("--days", type=int, default=HISTORY_RETENTION_DAYS)
+    compact.add_argument("--batch-size", type=int, default=5000)
+    compact.set_defaults(func=compact_history)
+    post = subparsers.add_parser("post-update", help="Update JSON ni webhook ga POST qilish")
+    post.add_argument("files", nargs="+")
+    post.add_argument("--url", default=f"http://localhost:{PORT}{WEBHOOK_PATH}")
+    post.add_argument("--secret", default=WEBHOOK_SECRET)
+    post.set_defaults(func=post_update)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+import functools
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler
+
+from router import CallbackRouter
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> str:
+        lines = [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in sorted(self._values.items())]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def summary(self) -> Dict[Tuple[str, ...], dict]:
+        """{labels: {count, avg, p50, p99}} - kvantillar bucket chegarasi bo'yicha taxminiy"""
+        result = {}
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                result[labels] = {
+                    "count": count,
+                    "avg": total / count if count else 0.0,
+                    "p50": self._quantile(counts, count, 0.5),
+                    "p99": self._quantile(counts, count, 0.99),
+                }
+        return result
+
+    def _quantile(self, counts, count: int, q: float) -> float:
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames))
+
+    def render(self) -> str:
+        """Prometheus text formati (0.0.4)"""
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+handler_seconds = REGISTRY.histogram("bot_handler_seconds", "Handler bajarilish vaqti", ("handler",))
+handler_errors = REGISTRY.counter("bot_handler_errors_total", "Handler xatolari", ("handler",))
+db_query_seconds = REGISTRY.histogram("bot_db_query_seconds", "database.py funksiyalari vaqti (worker ichida)", ("query",))
+db_query_errors = REGISTRY.counter("bot_db_query_errors_total", "database.py funksiyalari xatolari", ("query",))
+broadcast_sends = REGISTRY.counter("bot_broadcast_sends_total", "Broadcast yuborishlar natijasi", ("status",))
+broadcast_rate = REGISTRY.gauge("bot_broadcast_messages_per_second", "Oxirgi broadcast tezligi")
+scheduled_bonuses = REGISTRY.gauge("bot_scheduled_bonuses", "Navbatdagi start bonuslari")
+pending_views = REGISTRY.gauge("bot_pending_views", "Hali saqlanmagan o'yin ko'rishlari")
+outbox_pending = REGISTRY.gauge("bot_outbox_pending", "Chiquvchi navbatdagi xabarlar")
+outbox_retry_after = REGISTRY.counter("bot_outbox_retry_after_total", "Chiquvchi navbatda olingan 429 javoblar")
+updates_dropped = REGISTRY.counter("bot_updates_dropped_total", "Handlerlarga yetmay rad etilgan update lar", ("reason",))
+updates_waiting = REGISTRY.gauge("bot_updates_waiting", "Bo'sh slot kutayotgan update lar")
+worker_processes = REGISTRY.gauge("bot_worker_processes", "Ishlayotgan worker jarayonlari (multi-process rejim)")
+history_rows_archived = REGISTRY.counter("bot_history_rows_archived_total", "Arxivga ko'chirilgan balans tarixi yozuvlari")
+update_queue_depth = REGISTRY.gauge("bot_update_queue_depth", "Worker navbatidagi yozuvlar", ("shard",))
+
+
+# ------------------- HANDLERLARNI O'LCHASH -------------------
+def handler_label(handler) -> str:
+    if isinstance(handler, CallbackQueryHandler) and handler.pattern is not None:
+        pattern = handler.pattern
+        return f"callback:{getattr(pattern, 'pattern', pattern)}"
+    if isinstance(handler, CommandHandler):
+        return "command:/" + ",".join(sorted(handler.commands))
+    return f"{type(handler).__name__}:{getattr(handler.callback, '__name__', 'callback')}"
+
+
+def instrument_callback(label: str, callback):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handler_errors.inc(label)
+            raise
+        finally:
+            handler_seconds.observe(label, value=time.perf_counter() - started)
+    return wrapper
+
+
+def _instrument_handler(handler):
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for inner in nested:
+            _instrument_handler(inner)
+        return
+    if isinstance(handler.callback, CallbackRouter):
+        # Bitta handler ortida ko'p yo'l - har birini alohida o'lchaymiz
+        handler.callback.wrap(lambda route, callback: instrument_callback(f"callback:{route}", callback))
+        return
+    handler.callback = instrument_callback(handler_label(handler), handler.callback)
+
+
+def instrument_application(app):
+    """main() da ro'yxatdan o'tgan barcha handlerlarni o'lchov bilan o'rash"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
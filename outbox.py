@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram.error import RetryAfter
+
+import metrics
+from broadcast import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ustuvorlik: kichik son oldin yuboriladi
+REPLY = 0
+NOTIFY = 1
+
+
+class _Item:
+    __slots__ = ("method", "args", "kwargs", "future", "attempt")
+
+    def __init__(self, method: Callable[..., Awaitable], args: tuple, kwargs: dict, future: asyncio.Future):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.attempt = 0
+
+
+class _Chat:
+    """Bitta chat navbati: har ustuvorlik uchun FIFO va chat tezlik cheklovi"""
+    __slots__ = ("queues", "tokens", "updated", "blocked_until", "busy")
+
+    def __init__(self, burst: float):
+        self.queues = (deque(), deque())
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.busy = False
+
+    def head_priority(self) -> Optional[int]:
+        for priority, items in enumerate(self.queues):
+            if items:
+                return priority
+        return None
+
+
+class Outbox:
+    """Broadcast dan tashqari barcha chiquvchi xabarlar uchun navbat.
+
+    `bucket` - jarayonning umumiy limiti: broadcast ham shundan token oladi
+    (past ustuvorlik bilan), shuning uchun jami yuborish OUTBOX_RATE dan oshmaydi.
+
+    Har bir chat o'z navbatiga ega va bir vaqtda faqat bitta so'rov yuboradi,
+    shuning uchun xabarlar tartibi saqlanadi. Chatlar orasida to'g'ridan-to'g'ri
+    javoblar (REPLY) bildirishnomalardan (NOTIFY) oldin chiqadi. Umumiy va
+    chat bo'yicha tezlik cheklanadi, RetryAfter kelsa chat shuncha kutib,
+    xabarni qayta yuboradi.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30,
+        burst: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        concurrency: int = 32,
+        max_retries: int = 3,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.pending = 0
+        self._chats: Dict[int, _Chat] = {}
+        self._ready = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._slots = None
+        self._task = None
+        self._tasks = set()
+
+    def send(self, chat_id: int, method: Callable[..., Awaitable], /, *args, priority: int = REPLY, **kwargs) -> asyncio.Future:
+        """`method(*args, **kwargs)` ni chat navbatiga qo'yish; natija future orqali qaytadi"""
+        future = asyncio.get_running_loop().create_future()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.chat_burst)
+        chat.queues[priority].append(_Item(method, args, kwargs, future))
+        self.pending += 1
+        metrics.outbox_pending.set(value=self.pending)
+        if not chat.busy:
+            self._push(chat_id, chat)
+        return future
+
+    def post(self, chat_id: int, method: Callable[..., Awaitable], /, *args, priority: int = NOTIFY, **kwargs) -> asyncio.Future:
+        """send() kabi, lekin natija kutilmaydi - xato faqat logga yoziladi"""
+        future = self.send(chat_id, method, *args, priority=priority, **kwargs)
+        future.add_done_callback(lambda done: self._log_error(chat_id, done))
+        return future
+
+    @staticmethod
+    def _log_error(chat_id: int, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Outbox send error ({chat_id}): {future.exception()}")
+
+    def _push(self, chat_id: int, chat: _Chat):
+        priority = chat.head_priority()
+        if priority is None:
+            return
+        delay = self._chat_delay(chat)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._push, chat_id, chat)
+            return
+        heapq.heappush(self._ready, (priority, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    def _chat_delay(self, chat: _Chat) -> float:
+        now = time.monotonic()
+        if chat.blocked_until > now:
+            return chat.blocked_until - now
+        if not self.chat_rate:
+            return 0.0
+        chat.tokens = min(self.chat_burst, chat.tokens + (now - chat.updated) * self.chat_rate)
+        chat.updated = now
+        return 0.0 if chat.tokens >= 1 else (1 - chat.tokens) / self.chat_rate
+
+    async def _next_chat(self):
+        while True:
+            while not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            # Eskirgan yozuv: chat band, bo'sh yoki hali vaqti kelmagan
+            if chat is None or chat.busy or chat.head_priority() is None:
+                continue
+            if self._chat_delay(chat) > 0:
+                self._push(chat_id, chat)
+                continue
+            return chat_id, chat
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            await self.bucket.acquire()
+            # Chat token olingandan keyin tanlanadi - kutish paytida kelgan javoblar oldinga o'tadi
+            chat_id, chat = await self._next_chat()
+            chat.busy = True
+            if self.chat_rate:
+                chat.tokens -= 1
+            task = asyncio.create_task(self._deliver(chat_id, chat))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, chat_id: int, chat: _Chat):
+        items = chat.queues[chat.head_priority()]
+        item = items[0]
+        try:
+            result = await item.method(*item.args, **item.kwargs)
+        except RetryAfter as e:
+            metrics.outbox_retry_after.inc()
+            item.attempt += 1
+            if item.attempt > self.max_retries:
+                self._finish(items, error=e)
+            else:
+                # Xabar navbat boshida qoladi - chat bloklanadi va keyin qayta yuboriladi
+                chat.blocked_until = time.monotonic() + e.retry_after
+        except Exception as e:
+            self._finish(items, error=e)
+        else:
+            self._finish(items, result=result)
+        finally:
+            self._slots.release()
+            chat.busy = False
+            if chat.head_priority() is None:
+                self._schedule_prune(chat_id, chat)
+            else:
+                self._push(chat_id, chat)
+
+    def _schedule_prune(self, chat_id: int, chat: _Chat):
+        # Bo'sh chat holati (tokenlar, blok) to'liq tiklanguncha saqlanadi
+        delay = max(0.0, chat.blocked_until - time.monotonic())
+        if self.chat_rate:
+            delay = max(delay, self.chat_burst / self.chat_rate)
+        asyncio.get_running_loop().call_later(delay, self._prune, chat_id, chat)
+
+    def _prune(self, chat_id: int, chat: _Chat):
+        if self._chats.get(chat_id) is chat and not chat.busy and chat.head_priority() is None:
+            del self._chats[chat_id]
+
+    def _finish(self, items: deque, result=None, error: Exception = None):
+        item = items.popleft()
+        self.pending -= 1
+        metrics.outbox_pending.set(value=self.pending)
+        if item.future.done():
+            return
+        if error is not None:
+            item.future.set_exception(error)
+        else:
+            item.future.set_result(result)
+
+    def start(self):
+        if self._task is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Navbatni `timeout` soniyagacha bo'shatib, to'xtatish"""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for chat in self._chats.values():
+            for items in chat.queues:
+                for item in items:
+                    item.future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self.pending = 0
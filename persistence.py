@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import pickle
+from typing import Any, Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+def _dump(value: Any) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SQLitePersistence(BasePersistence):
+    """ConversationHandler holatlari, user_data va bot_data ni asosiy bazada saqlash.
+
+    Har bir kalit alohida qator: PTB har `update_interval` da bergan nusxa
+    oxirgi yozilgan holat bilan solishtiriladi va faqat o'zgargan kalitlar
+    bitta tranzaksiyada yoziladi. user_data ishga tushganda emas, foydalanuvchi
+    birinchi marta kelganda yuklanadi - restart vaqti foydalanuvchilar
+    soniga bog'liq emas. chat_data va callback_data ishlatilmaydi.
+    """
+
+    def __init__(self, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        # Oxirgi yozilgan/yuklangan holat: {kalit: pickle}
+        self._users: Dict[int, Dict[Any, bytes]] = {}
+        self._bot: Dict[Any, bytes] = {}
+        # Yozilishi kutilayotgan o'zgarishlar (None - o'chirish)
+        self._pending: Dict[Tuple, Optional[bytes]] = {}
+        self._dropped: Set[int] = set()
+        self._write_task = None
+
+    # ----- o'qish -----
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self._users:
+            return
+        rows = await database.load_user_data(user_id)
+        # Yuklash paytida boshqa update yuklab qo'ygan bo'lishi mumkin
+        if user_id in self._users:
+            return
+        self._users[user_id] = dict((pickle.loads(key), value) for key, value in rows)
+        for key, value in self._users[user_id].items():
+            user_data.setdefault(key, pickle.loads(value))
+
+    async def get_bot_data(self) -> dict:
+        rows = await database.load_bot_data()
+        self._bot = dict((pickle.loads(key), value) for key, value in rows)
+        return {key: pickle.loads(value) for key, value in self._bot.items()}
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await database.load_conversations(name)
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    # ----- yozish (navbatga) -----
+    @staticmethod
+    def _diff(saved: Dict[Any, bytes], data: dict, prefix: tuple, pending: dict):
+        """`saved` ni `data` ga moslab yangilash, farqlarni `pending` ga qo'shish"""
+        for key, value in data.items():
+            dumped = _dump(value)
+            if saved.get(key) != dumped:
+                saved[key] = dumped
+                pending[(*prefix, _dump(key))] = dumped
+        for key in [key for key in saved if key not in data]:
+            del saved[key]
+            pending[(*prefix, _dump(key))] = None
+
+    async def update_user_data(self, user_id: int, data: dict):
+        saved = self._users.setdefault(user_id, {})
+        if data or saved:
+            self._diff(saved, data, ("user", user_id), self._pending)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int):
+        self._users[user_id] = {}
+        self._dropped.add(user_id)
+        for change in [change for change in self._pending if change[:2] == ("user", user_id)]:
+            del self._pending[change]
+        self._schedule_write()
+
+    async def update_bot_data(self, data: dict):
+        self._diff(self._bot, data, ("bot",), self._pending)
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]):
+        self._pending[("conversation", name, json.dumps(list(key)))] = None if new_state is None else _dump(new_state)
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    # ----- bazaga yozish -----
+    def _schedule_write(self):
+        # PTB barcha update_* larni gather bilan chaqiradi - yozuv ular tugagach bitta task da
+        if (self._pending or self._dropped) and (self._write_task is None or self._write_task.done()):
+            self._write_task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        while self._pending or self._dropped:
+            pending, self._pending = self._pending, {}
+            dropped, self._dropped = self._dropped, set()
+            rows = {"user": [], "bot": [], "conversation": []}
+            for (kind, *key), value in pending.items():
+                rows[kind].append((*key, value))
+            try:
+                await database.write_persistence(list(dropped), rows["user"], rows["bot"], rows["conversation"])
+            except Exception as e:
+                logger.error(f"Persistence write error: {e}")
+                # Keyingi urinishda yoziladi, yangiroq o'zgarishlar ustun
+                for change, value in pending.items():
+                    self._pending.setdefault(change, value)
+                self._dropped |= dropped
+                return
+
+    async def flush(self):
+        if self._write_task is not None:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await self._write()
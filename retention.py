@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import time
+
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def history_cutoff(retention_days: int, now: float = None) -> str:
+    """Faqat to'liq oylar arxivlanadi: `retention_days` oldingi sana tushgan oyning boshi (UTC)"""
+    moment = time.gmtime((time.time() if now is None else now) - retention_days * 86400)
+    return time.strftime("%Y-%m-01 00:00:00", moment)
+
+
+class HistoryCompactor:
+    """balance_history ni vaqti-vaqti bilan ixchamlovchi fon vazifasi.
+
+    Eski yozuvlar partiyalab arxiv fayliga ko'chiriladi, asosiy bazada esa
+    foydalanuvchi va oy bo'yicha yig'indi qoladi. Har partiya DB worker dagi
+    alohida qisqa vazifa, shuning uchun handler so'rovlari orada bajariladi.
+    """
+
+    def __init__(self, retention_days: int, interval: float, batch_size: int = 5000):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+    async def compact(self) -> int:
+        """Bir marta to'liq ixchamlash; ko'chirilgan yozuvlar soni"""
+        cutoff = history_cutoff(self.retention_days)
+        total = 0
+        while True:
+            moved = await database.compact_balance_history(cutoff, self.batch_size)
+            total += moved
+            metrics.history_rows_archived.inc(amount=moved)
+            if moved < self.batch_size:
+                return total
+            await asyncio.sleep(0)
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await self.compact()
+                if moved:
+                    logger.info(f"Balance history archived: {moved}")
+            except Exception as e:
+                logger.error(f"History compaction error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.retention_days > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,46 @@
+from typing import Awaitable, Callable, Dict, Optional
+
+Callback = Callable[..., Awaitable]
+
+
+class CallbackRouter:
+    """callback_data ni prefiks va argumentga ajratib, lug'at orqali yo'naltiruvchi router.
+
+    Ketma-ket regex tekshiruvlari o'rniga bitta CallbackQueryHandler:
+    avval to'liq moslik (`"balance"`), keyin birinchi `_` gacha bo'lgan
+    prefiks (`"game_"` -> argument o'yin nomi). Ikkala qidiruv ham O(1).
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Callback] = {}
+        self._prefixes: Dict[str, Callback] = {}
+
+    def exact(self, data: str, callback: Callback):
+        self._exact[data] = callback
+
+    def prefix(self, prefix: str, callback: Callback):
+        if not prefix.endswith("_") or "_" in prefix[:-1]:
+            raise ValueError(f"Route prefix must end with its only '_': {prefix!r}")
+        self._prefixes[prefix] = callback
+
+    def resolve(self, data: Optional[str]) -> Optional[Callback]:
+        if not data:
+            return None
+        callback = self._exact.get(data)
+        if callback is None:
+            cut = data.find("_")
+            if cut != -1:
+                callback = self._prefixes.get(data[:cut + 1])
+        return callback
+
+    def matches(self, data) -> bool:
+        """CallbackQueryHandler(pattern=...) uchun: faqat ro'yxatdagi yo'llar"""
+        return isinstance(data, str) and self.resolve(data) is not None
+
+    async def __call__(self, update, context):
+        return await self.resolve(update.callback_query.data)(update, context)
+
+    def wrap(self, wrapper: Callable[[str, Callback], Callback]):
+        """Har bir yo'lni o'rash (masalan, o'lchov uchun), yorliq bilan"""
+        self._exact = {data: wrapper(data, callback) for data, callback in self._exact.items()}
+        self._prefixes = {prefix: wrapper(f"{prefix}*", callback) for prefix, callback in self._prefixes.items()}
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NotifyCallback = Callable[[List[Tuple[int, int]]], Awaitable]
+
+
+class BonusScheduler:
+    """scheduled_bonuses jadvalini bitta sikl bilan bo'shatuvchi rejalashtiruvchi.
+
+    Har foydalanuvchi uchun alohida uxlovchi task o'rniga vaqti kelgan
+    bonuslar due_at indeksi bo'yicha partiyalab to'lanadi. Jadval bazada
+    bo'lgani uchun restartdan keyin sikl qolgan bonuslarni o'zi davom ettiradi.
+    """
+
+    def __init__(self, amount: int, batch_size: int = 500, max_sleep: float = 60.0):
+        self.amount = amount
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self._next_due = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._notify_tasks = set()
+
+    async def schedule(self, user_id: int, delay: float):
+        """Bonusni `delay` soniyadan keyin to'lashga qo'yish"""
+        due_at = time.time() + delay
+        if await database.schedule_start_bonus(user_id, due_at):
+            if self._next_due is None or due_at < self._next_due:
+                self._wakeup.set()
+
+    async def _pay_due(self, notify: NotifyCallback) -> int:
+        paid = await database.pay_due_bonuses(time.time(), self.amount, self.batch_size)
+        if paid:
+            logger.info(f"Start bonus paid: {len(paid)}")
+            task = asyncio.create_task(notify(paid))
+            self._notify_tasks.add(task)
+            task.add_done_callback(self._notify_tasks.discard)
+        return len(paid)
+
+    async def _run(self, notify: NotifyCallback):
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self._pay_due(notify) >= self.batch_size:
+                    pass
+                self._next_due = await database.get_next_bonus_due()
+                metrics.scheduled_bonuses.set(value=await database.get_scheduled_bonuses_count())
+            except Exception as e:
+                logger.error(f"Bonus scheduler error: {e}")
+                self._next_due = None
+
+            timeout = self.max_sleep
+            if self._next_due is not None:
+                timeout = min(self.max_sleep, max(0.0, self._next_due - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, notify: NotifyCallback):
+        """notify([(user_id, yangi balans)]) - to'langan bonuslar haqida xabar berish"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(notify))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*self._notify_tasks, return_exceptions=True)
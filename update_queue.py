@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+from database import DatabaseWorker
+
+# Navbat yozuvlari turlari
+UPDATE = "update"
+INVALIDATE = "invalidate"
+
+
+class QueueWorker(DatabaseWorker):
+    """Navbat fayli uchun ishchi oqim: yozuvlar qisqa yashaydi, fsync shart emas"""
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+
+def _init_queue(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shard INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_shard ON queue(shard, id)")
+    conn.commit()
+
+
+def _queue_put(conn: sqlite3.Connection, rows: List[Tuple[int, str, str]]):
+    conn.executemany("INSERT INTO queue (shard, kind, payload) VALUES (?, ?, ?)", rows)
+    conn.commit()
+
+
+def _queue_fetch(conn: sqlite3.Connection, shard: int, after_id: int, limit: int) -> list:
+    return conn.execute(
+        "SELECT id, kind, payload FROM queue WHERE shard = ? AND id > ? ORDER BY id LIMIT ?",
+        (shard, after_id, limit),
+    ).fetchall()
+
+
+def _queue_ack(conn: sqlite3.Connection, ids: List[int]):
+    conn.executemany("DELETE FROM queue WHERE id = ?", [(queue_id,) for queue_id in ids])
+    conn.commit()
+
+
+def _queue_depth(conn: sqlite3.Connection) -> Dict[int, int]:
+    return dict(conn.execute("SELECT shard, COUNT(*) FROM queue GROUP BY shard").fetchall())
+
+
+class UpdateQueue:
+    """Ingress va worker jarayonlari orasidagi SQLite navbat.
+
+    Yozuvlar user_id bo'yicha shardlarga bo'linadi: bitta foydalanuvchining
+    barcha update lari bitta worker ga, kelgan tartibida tushadi. Yozuv
+    bajarilgandan keyin o'chiriladi (ack), shuning uchun worker qulasa
+    tugallanmagan update lar qayta ishga tushganda yana o'qiladi.
+    """
+
+    def __init__(self, path: str, shards: int):
+        self.shards = shards
+        self._worker = QueueWorker(path)
+        self._worker.submit(_init_queue).result()
+
+    def shard_of(self, user_id: int) -> int:
+        return user_id % self.shards
+
+    async def _run(self, fn, *args):
+        return await asyncio.wrap_future(self._worker.submit(fn, *args))
+
+    async def put(self, items: Iterable[Tuple[int, str, str]]):
+        """[(user_id, kind, payload)] ni tegishli shardlarga yozish"""
+        rows = [(self.shard_of(user_id), kind, payload) for user_id, kind, payload in items]
+        if rows:
+            await self._run(_queue_put, rows)
+
+    async def fetch(self, shard: int, after_id: int, limit: int = 100) -> list:
+        """Shard dagi `after_id` dan keyingi yozuvlar: [(id, kind, payload)]"""
+        return await self._run(_queue_fetch, shard, after_id, limit)
+
+    async def ack(self, ids: List[int]):
+        if ids:
+            await self._run(_queue_ack, ids)
+
+    async def depth(self) -> Dict[int, int]:
+        return await self._run(_queue_depth)
+
+    def close(self):
+        self._worker.close()
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# flush(deltas, events): {o'yin: soni} va [(o'yin, user_id, unix vaqt)]
+FlushCallback = Callable[[Dict[str, int], List[Tuple[str, Optional[int], int]]], Awaitable[None]]
+
+
+class ViewCounter:
+    """O'yin ko'rishlarini xotirada yig'ib, fonda (write-behind) saqlash.
+
+    Har ko'rish hodisa sifatida ham yig'iladi (analitika uchun). Saqlash
+    `interval` soniyada bir marta yoki `max_dirty` ta yangi ko'rish
+    yig'ilganda ishga tushadi. To'xtatishda oxirgi marta saqlanadi.
+    """
+
+    def __init__(self, flush: FlushCallback, interval: float = 5.0, max_dirty: int = 500):
+        self._flush_cb = flush
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.pending: Dict[str, int] = {}
+        self.events: List[Tuple[str, Optional[int], int]] = []
+        self._dirty = 0
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def hit(self, name: str, user_id: int = None, count: int = 1):
+        """Ko'rishni xotirada hisoblash (disk yo'q)"""
+        self.pending[name] = self.pending.get(name, 0) + count
+        self.events.append((name, user_id, int(time.time())))
+        self._dirty += count
+        if self._dirty >= self.max_dirty:
+            self._wakeup.set()
+
+    def get(self, name: str) -> int:
+        """Hali saqlanmagan ko'rishlar soni"""
+        return self.pending.get(name, 0)
+
+    async def flush(self):
+        """Yig'ilgan ko'rishlarni saqlash; xato bo'lsa keyingi safarga qaytariladi"""
+        async with self._lock:
+            if not self.pending:
+                return
+            deltas, self.pending = self.pending, {}
+            events, self.events = self.events, []
+            self._dirty = 0
+            try:
+                await self._flush_cb(deltas, events)
+            except Exception:
+                for name, count in deltas.items():
+                    self.pending[name] = self.pending.get(name, 0) + count
+                    self._dirty += count
+                self.events[:0] = events
+                raise
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"View flush error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Fon vazifasini to'xtatish va oxirgi marta saqlash"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Request:
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Response:
+    def __init__(self, status: int = 200, body: bytes = b"", content_type: str = "text/plain; charset=utf-8"):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+    @classmethod
+    def json(cls, data, status: int = 200) -> "Response":
+        return cls(status, json.dumps(data).encode(), "application/json")
+
+    @classmethod
+    def text(cls, text: str, status: int = 200) -> "Response":
+        return cls(status, text.encode())
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class WebServer:
+    """Health check va webhook uchun kichik asyncio HTTP/1.1 server (keep-alive bilan)"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8080):
+        self.host = host
+        self.port = port
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._server = None
+
+    def route(self, method: str, path: str, handler: Handler):
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_SIZE:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target.split("?", 1)[0], headers, body)
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return Response.text("method not allowed", 405)
+            return Response.text("not found", 404)
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"HTTP handler error {request.method} {request.path}: {e}")
+            return Response.text("internal error", 500)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self._write(writer, Response.text("bad request", 400), close=True)
+                    break
+                if request is None:
+                    break
+                response = await self._dispatch(request)
+                close = request.headers.get("connection", "").lower() == "close"
+                await self._write(writer, response, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, response: Response, close: bool):
+        head = (
+            f"HTTP/1.1 {response.status} {STATUS_TEXT.get(response.status, '')}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + response.body)
+        await writer.drain()
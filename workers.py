@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from telegram import Update
+
+import database
+import metrics
+from limiter import DUPLICATE
+from update_queue import INVALIDATE, UpdateQueue
+
+logger = logging.getLogger(__name__)
+
+
+class ShardConsumer:
+    """Worker jarayoni: o'z shardidagi yozuvlarni navbatdan o'qib bajarish.
+
+    Turli foydalanuvchilar update lari parallel, bitta foydalanuvchiniki esa
+    qat'iy navbat tartibida (oldingisi tugagach) qayta ishlanadi. Slot faqat
+    update navbati kelganda olinadi; zanjirda kutayotgan bir xil callback
+    (foydalanuvchi + data) bajarilmaydi. Bu jarayonda
+    o'zgargan, lekin boshqa shardga tegishli profillar uchun o'sha shardga
+    keshni bekor qilish yozuvi yuboriladi.
+    """
+
+    def __init__(
+        self,
+        app,
+        update_queue: UpdateQueue,
+        shard: int,
+        concurrency: int = 64,
+        batch_size: int = 100,
+        poll_interval: float = 0.05,
+        max_pending: int = None,
+    ):
+        self.app = app
+        self.queue = update_queue
+        self.shard = shard
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        # Navbatdan o'qilgan, hali tugamagan update lar (zanjirda kutayotganlar ham) chegarasi
+        self._pending = asyncio.Semaphore(max_pending or concurrency * 4)
+        self._queued: Set[Tuple[int, str]] = set()
+        self._chains: Dict[int, asyncio.Task] = {}
+        self._done: List[int] = []
+        self._invalidations = deque()
+        self._stop = asyncio.Event()
+
+    def forward_invalidation(self, user_id: int):
+        """TTLCache.listener: DB oqimidan ham chaqiriladi, shuning uchun faqat navbatga qo'shadi"""
+        if self.queue.shard_of(user_id) != self.shard:
+            self._invalidations.append(user_id)
+
+    async def _flush(self):
+        invalidations = set()
+        while self._invalidations:
+            invalidations.add(self._invalidations.popleft())
+        await self.queue.put((user_id, INVALIDATE, str(user_id)) for user_id in invalidations)
+        done, self._done = self._done, []
+        await self.queue.ack(done)
+
+    async def _process(self, queue_id: int, update: Update, previous: Optional[asyncio.Task], callback: Optional[tuple]):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            # Kutish paytida slot band emas - bitta foydalanuvchi zanjiri boshqalarni to'smaydi
+            async with self._slots:
+                await self.app.process_update(update)
+        except Exception as e:
+            logger.error(f"Worker {self.shard} update error: {e}")
+        finally:
+            self._queued.discard(callback)
+            self._pending.release()
+            self._done.append(queue_id)
+            self.processed += 1
+
+    def _dispatch(self, queue_id: int, payload: str):
+        update = Update.de_json(json.loads(payload), self.app.bot)
+        user = update.effective_user
+        key = user.id if user else 0
+        callback = None
+        if user is not None and update.callback_query is not None:
+            callback = (user.id, update.callback_query.data)
+            if callback in self._queued:
+                # Xuddi shu tugma zanjirda kutmoqda yoki bajarilmoqda - ikkinchi marta bajarilmaydi
+                metrics.updates_dropped.inc(DUPLICATE)
+                self.app.create_task(update.callback_query.answer())
+                self._pending.release()
+                self._done.append(queue_id)
+                return
+            self._queued.add(callback)
+        task = asyncio.create_task(self._process(queue_id, update, self._chains.get(key), callback))
+        self._chains[key] = task
+        task.add_done_callback(functools.partial(self._release_chain, key))
+
+    def _release_chain(self, key: int, task: asyncio.Task):
+        if self._chains.get(key) is task:
+            del self._chains[key]
+
+    async def run(self):
+        """stop() chaqirilguncha navbatni o'qish; oxirida boshlanganlari tugatiladi"""
+        database.profile_cache.listener = self.forward_invalidation
+        last_id = 0
+        try:
+            while not self._stop.is_set():
+                rows = await self.queue.fetch(self.shard, last_id, self.batch_size)
+                for queue_id, kind, payload in rows:
+                    last_id = queue_id
+                    if kind == INVALIDATE:
+                        database.profile_cache.invalidate(int(payload))
+                        self._done.append(queue_id)
+                        continue
+                    await self._pending.acquire()
+                    try:
+                        self._dispatch(queue_id, payload)
+                    except Exception as e:
+                        self._pending.release()
+                        self._done.append(queue_id)
+                        logger.error(f"Worker {self.shard} bad update {queue_id}: {e}")
+                await self._flush()
+                if len(rows) < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await asyncio.gather(*self._chains.values(), return_exceptions=True)
+            await self._flush()
+            database.profile_cache.listener = None
+
+    def stop(self):
+        self._stop.set()
+
+
+class WorkerPool:
+    """Ingress jarayoni ishga tushiradigan worker jarayonlari (o'lganini qayta ishga tushiradi)"""
+
+    def __init__(self, target: Callable, count: int, args: tuple = (), check_interval: float = 2.0):
+        self.target = target
+        self.count = count
+        self.args = args
+        self.check_interval = check_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * count
+        self._task = None
+
+    def _spawn(self, shard: int):
+        process = self._context.Process(
+            target=self.target, args=(shard, self.count, *self.args), name=f"bot-worker-{shard}", daemon=True
+        )
+        process.start()
+        self._processes[shard] = process
+        logger.info(f"Worker {shard} started (pid {process.pid})")
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for shard, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"Worker {shard} exited with code {process.exitcode}, restarting")
+                    self._spawn(shard)
+            metrics.worker_processes.set(value=sum(1 for p in self._processes if p is not None and p.is_alive()))
+
+    def start(self):
+        for shard in range(self.count):
+            self._spawn(shard)
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self, timeout: float = 15.0):
+        """SIGTERM yuborib, tugashini kutish"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        await asyncio.to_thread(self._join, timeout)
+
+    def _join(self, timeout: float):
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.kill()